@@ -1,74 +1,45 @@
 import json
 import glob
+import os
 from pathlib import Path
 from datetime import datetime, date
 import functools
+import numpy as np
 import pandas as pd
 from collections import defaultdict
 
+from data_processing import profiling, speech_store
+
 DATA_DIR = Path("data")
 SPEECH_FOLDER = DATA_DIR / "text_data/"
 TOPIC_SCORE_FOLDER = DATA_DIR / "topic_scores/"
-RATES_FILE = DATA_DIR / "price_data/2025-10-26 Fed Funds 12M 6M Historical Swap Rates.xlsx"
+PRICE_DATA_DIR = DATA_DIR / "price_data"
+RATES_FILE = PRICE_DATA_DIR / "2025-10-26 Fed Funds 12M 6M Historical Swap Rates.xlsx"
 EMBEDDING_FILE = DATA_DIR / "speeches_with_embeddings.json"
+CACHE_DIR = DATA_DIR / "cache"
+CORPUS_FILE = CACHE_DIR / "speech_corpus.npz"
+TOPIC_SCORE_FILE = CACHE_DIR / "topic_scores.npz"
+RATE_PANEL_FILE = CACHE_DIR / "rate_panel.npz"
+SCORE_MODEL = "gpt-5"
 
 START_DATE = datetime(2018, 6, 1)
 FORWARD_DAYS = 5
+LOOKBACK_DAYS = 30
 
 def load_topic_scores_by_sid(path=TOPIC_SCORE_FOLDER):
+    return load_topic_score_index(path).by_sid()
 
-    json_files = glob.glob(str(path) + "/*.json")
-    scores = {}
-    speeches = load_speeches()
-
-    for json_file in json_files:
-        with open(json_file, "r", encoding="utf-8") as f:
-            raw = json.load(f)
-
-        for row in raw:
-            sid = row["id"]
-            if sid not in speeches:
-                continue
-            scores[sid] = row["gpt-5"]
-
-    return scores
-
-def load_topic_scores_by_date(path=TOPIC_SCORE_FOLDER, apply_average=True):
-
-    json_files = glob.glob(str(path) + "/*.json")
-    scores = {}
-    speeches = load_speeches()
-
-    for json_file in json_files:
-        with open(json_file, "r", encoding="utf-8") as f:
-            raw = json.load(f)
-
-        for row in raw:
-            sid = row["id"]
-            if sid not in speeches:
-                continue
-            date = speeches[sid]["date"]
-            if date not in scores:
-                scores[date] = []
-
-            scores[date] += [row["gpt-5"]]
-
-    if apply_average:
-        final_scores = {}
-        for date, values in scores.items():
-            score_dict = {}
-            for value in values:
-                for topic in value:
-                    if topic not in score_dict:
-                        score_dict[topic] = 0
-                    score_dict[topic] += value[topic]/len(values)
-            final_scores[date] = score_dict
-    else:
-        final_scores = {}
-        for date in scores:
-            final_scores[date] = scores[date][-1]
-
-    return final_scores
+@profiling.profiled("load_topic_scores_by_date")
+def load_topic_scores_by_date(path=TOPIC_SCORE_FOLDER, apply_average=True, how=None):
+    """
+    {date: {topic: score}} aggregated over the speeches of each date. how is "mean", "last", "sum"
+    or "count"; by default apply_average=True gives "mean" and apply_average=False "last" (the last
+    speech of the day in score-file order).
+    """
+    how = how or ("mean" if apply_average else "last")
+    frame = load_topic_score_index(path).by_date(how)
+    profiling.count(items=len(frame))
+    return {d.to_pydatetime(): row.to_dict() for d, row in frame.iterrows()}
 
 def parse_date(dstr: str) -> date:
     """
@@ -92,28 +63,304 @@ def parse_date(dstr: str) -> date:
 
 
 @functools.lru_cache(maxsize=None)
+def _parse_date_cached(dstr: str) -> date:
+    return parse_date(dstr)
+
+
+def _speech_files(path):
+    """Per-author speech files; the speech_store .idx.json sidecars are not speeches."""
+    return sorted(f for f in glob.glob(str(path) + "/*.json") if not f.endswith(".idx.json"))
+
+
+def _corpus_fingerprint(json_files):
+    """Name, size and mtime of every source JSON and its append log; any change triggers a rebuild."""
+    entries = []
+    for json_file in json_files:
+        for source in [Path(json_file), Path(json_file).with_suffix(".jsonl"),
+                       Path(json_file).with_suffix(".jsonl.compacting")]:
+            if source.exists():
+                st = os.stat(source)
+                entries.append([source.name, st.st_size, st.st_mtime_ns])
+    return json.dumps(entries)
+
+
+def build_speech_corpus(path=SPEECH_FOLDER, corpus_file=CORPUS_FILE):
+    """
+    Ingest all per-author speech files (base JSON + append log) into one columnar .npz file.
+    Columns: id, author, date (datetime64[D]) and the UTF-8 text blob + offsets.
+    """
+    json_files = _speech_files(path)
+
+    ids, authors, raw_dates, texts = [], [], [], []
+    for json_file in json_files:
+        author = Path(json_file).stem
+        # compacted entries plus anything appended by the scrapers since
+        raw = speech_store.read_entries(json_file)
+
+        for row in raw:
+            ids.append(row["id"])
+            authors.append(author)
+            raw_dates.append(row["date"])
+            texts.append(row["text"] or "")
+
+    # ISO dates parse vectorized, anything else goes through parse_date once per distinct string
+    dates = pd.to_datetime(pd.Series(raw_dates, dtype=object).str.strip(), format="%Y-%m-%d", errors="coerce")
+    for i in np.flatnonzero(dates.isna().to_numpy()):
+        dates.iloc[i] = _parse_date_cached(raw_dates[i])
+
+    encoded = [t.encode("utf-8") for t in texts]
+    text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    text_offsets[1:] = np.cumsum([len(b) for b in encoded])
+
+    columns = {
+        "id": np.array(ids, dtype=str),
+        "author": np.array(authors, dtype=str),
+        "date": dates.to_numpy().astype("datetime64[D]"),
+        "text_offsets": text_offsets,
+        "text_bytes": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "fingerprint": np.array(_corpus_fingerprint(json_files)),
+    }
+
+    corpus_file = Path(corpus_file)
+    corpus_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = corpus_file.with_suffix(".tmp.npz")
+    np.savez(tmp_file, **columns)
+    os.replace(tmp_file, corpus_file)
+    return columns
+
+
+_CORPUS_CACHE = {}
+
+@profiling.profiled("load_corpus")
+def load_corpus(path=SPEECH_FOLDER, corpus_file=CORPUS_FILE):
+    """
+    Return the columnar speech corpus, rebuilding the .npz only when a source JSON changed.
+    The columns are shared between callers, do not modify them in place.
+    """
+    json_files = _speech_files(path)
+    fingerprint = _corpus_fingerprint(json_files)
+
+    key = (str(path), str(corpus_file))
+    cached = _CORPUS_CACHE.get(key)
+    if cached is not None and cached["fingerprint"] == fingerprint:
+        profiling.count(items=len(cached["id"]), hits=1)
+        return cached
+
+    columns = None
+    if Path(corpus_file).exists():
+        with np.load(corpus_file) as npz:
+            if str(npz["fingerprint"]) == fingerprint:
+                columns = {k: npz[k] for k in npz.files}
+    profiling.count(hits=columns is not None, misses=columns is None)
+    if columns is None:
+        columns = build_speech_corpus(path, corpus_file)
+    profiling.count(items=len(columns["id"]))
+
+    columns = {k: v for k, v in columns.items() if k != "fingerprint"}
+    columns["fingerprint"] = fingerprint
+    _CORPUS_CACHE[key] = columns
+    return columns
+
+
+def corpus_text(corpus, i):
+    start, end = corpus["text_offsets"][i], corpus["text_offsets"][i + 1]
+    return corpus["text_bytes"][start:end].tobytes().decode("utf-8")
+
+
+def _corpus_rows_since_start(corpus):
+    return np.flatnonzero(corpus["date"] >= np.datetime64(START_DATE, "D"))
+
+
+def load_speech_dates(path=SPEECH_FOLDER):
+    """sid -> speech date for every speech kept by load_speeches, without decoding any text."""
+    corpus = load_corpus(path)
+    rows = _corpus_rows_since_start(corpus)
+    dates = corpus["date"][rows].astype("datetime64[us]").tolist()
+    return dict(zip(corpus["id"][rows].tolist(), dates))
+
+
+_SPEECHES_CACHE = {}
+
+@profiling.profiled("load_speeches")
 def load_speeches(path=SPEECH_FOLDER):
-    json_files = glob.glob(str(path) + "/*.json")
+    """
+    sid -> {author, text, date} for every speech since START_DATE, rebuilt only when load_corpus
+    sees a source JSON change. The dict is shared between callers, do not modify it in place.
+    """
+    corpus = load_corpus(path)
+    cached = _SPEECHES_CACHE.get(str(path))
+    if cached is not None and cached[0] == corpus["fingerprint"]:
+        profiling.count(items=len(cached[1]), hits=1)
+        return cached[1]
+
+    rows = _corpus_rows_since_start(corpus)
+
+    ids = corpus["id"][rows].tolist()
+    authors = corpus["author"][rows].tolist()
+    dates = corpus["date"][rows].astype("datetime64[us]").tolist()
 
     speeches = {}
+    for i, sid, author, d in zip(rows, ids, authors, dates):
+        speeches[sid] = {
+            "author": author,
+            "text": corpus_text(corpus, i),
+            "date": d,
+        }
+    profiling.count(items=len(speeches), misses=1)
+    _SPEECHES_CACHE[str(path)] = (corpus["fingerprint"], speeches)
+    return speeches
 
-    for json_file in json_files:
+
+class TopicScoreIndex:
+    """
+    Tone scores as a dense float32 [num_speeches, num_topics] matrix. Rows are the speeches since
+    START_DATE in sorted id order and columns the sorted topic names, i.e. the speech2idx / topic2idx
+    order of build_global_indices; a speech without a score is a row of NaN.
+    """
+
+    def __init__(self, sids, topics, scores, dates, order, key_order):
+        self.sids = list(sids)
+        self.topics = list(topics)
+        self.scores = scores
+        self.dates = dates
+        self.order = order  # position of the score row in the (sorted) score files, -1 if unscored
+        self.key_order = list(key_order)  # topic order of the score JSON, kept for by_sid()
+        self.scored = order >= 0
+
+    def frame(self):
+        """Scored speeches as a DataFrame indexed by speech date, in score-file order."""
+        rows = np.flatnonzero(self.scored)
+        rows = rows[np.argsort(self.order[rows], kind="stable")]
+        index = pd.DatetimeIndex(self.dates[rows].astype("datetime64[ns]"))
+        return pd.DataFrame(self.scores[rows], index=index, columns=self.topics)
+
+    def by_sid(self):
+        cols = [self.topics.index(t) for t in self.key_order]
+        values = self.scores[:, cols].tolist()
+        return {self.sids[i]: dict(zip(self.key_order, values[i])) for i in np.flatnonzero(self.scored)}
+
+    def by_date(self, how="mean"):
+        """One row per speech date: the mean, last, sum or count of that day's scores."""
+        grouped = self.frame().groupby(level=0)
+        if how == "mean":
+            return grouped.mean()
+        if how == "last":
+            return grouped.last()
+        if how == "sum":
+            return grouped.sum()
+        if how == "count":
+            return grouped.count()
+        raise ValueError(f"Unknown aggregation: {how}")
+
+    def rolling(self, lookback_days=LOOKBACK_DAYS, how="mean", dates=None):
+        """
+        Aggregate over the speeches in [d - lookback_days + 1, d] for every calendar day d
+        (or only for `dates`), from the daily sums and counts.
+        """
+        daily_sum, daily_count = self.by_date("sum"), self.by_date("count")
+        end = daily_sum.index.max()
+        if dates is not None:
+            dates = pd.DatetimeIndex(dates)
+            end = max(end, dates.max())
+        calendar = pd.date_range(daily_sum.index.min(), end, freq="D")
+
+        window_sum = daily_sum.reindex(calendar, fill_value=0).rolling(lookback_days, min_periods=1).sum()
+        window_count = daily_count.reindex(calendar, fill_value=0).rolling(lookback_days, min_periods=1).sum()
+        if how == "mean":
+            result = window_sum / window_count.where(window_count > 0)
+        elif how == "sum":
+            result = window_sum
+        elif how == "count":
+            result = window_count
+        elif how == "last":
+            result = self.by_date("last").reindex(calendar).ffill(limit=lookback_days - 1)
+        else:
+            raise ValueError(f"Unknown aggregation: {how}")
+
+        if dates is not None:
+            result = result.reindex(dates)
+        return result
+
+
+def _score_files(path):
+    return sorted(glob.glob(str(path) + "/*.json"))
+
+
+def build_topic_score_index(path=TOPIC_SCORE_FOLDER, score_file=TOPIC_SCORE_FILE, fingerprint=None):
+    """Scan the score JSON files once into the arrays of a TopicScoreIndex and cache them as .npz."""
+    speech_dates = load_speech_dates()
+    sids = sorted(speech_dates)
+    sid2row = {sid: i for i, sid in enumerate(sids)}
+
+    rows, values, key_order = [], [], []
+    for json_file in _score_files(path):
         with open(json_file, "r", encoding="utf-8") as f:
             raw = json.load(f)
-
         for row in raw:
-
-            sid = row["id"]
-            date = parse_date(row["date"])
-            if date < START_DATE:
+            if row["id"] not in sid2row:
                 continue
+            rows.append(sid2row[row["id"]])
+            values.append(row[SCORE_MODEL])
+            key_order += [t for t in row[SCORE_MODEL] if t not in key_order]
+
+    topics = sorted(key_order)
+    topic2col = {t: j for j, t in enumerate(topics)}
+    scores = np.full((len(sids), len(topics)), np.nan, dtype=np.float32)
+    order = np.full(len(sids), -1, dtype=np.int64)
+    for position, (i, value) in enumerate(zip(rows, values)):
+        for t, v in value.items():
+            scores[i, topic2col[t]] = v
+        order[i] = position
+
+    columns = {
+        "sids": np.array(sids, dtype=str),
+        "topics": np.array(topics, dtype=str),
+        "scores": scores,
+        "dates": np.array([speech_dates[sid] for sid in sids], dtype="datetime64[D]"),
+        "order": order,
+        "key_order": np.array(key_order, dtype=str),
+        "fingerprint": np.array(fingerprint or _topic_score_fingerprint(path)),
+    }
 
-            speeches[sid] = {
-                "author": json_file.split("/")[-1].split(".")[0],
-                "text": row["text"],
-                "date": parse_date(row["date"]),
-            }
-    return speeches
+    score_file = Path(score_file)
+    score_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = score_file.with_suffix(".tmp.npz")
+    np.savez(tmp_file, **columns)
+    os.replace(tmp_file, score_file)
+    return columns
+
+
+def _topic_score_fingerprint(path):
+    score_files = [[Path(f).name, os.stat(f).st_size, os.stat(f).st_mtime_ns] for f in _score_files(path)]
+    return json.dumps([score_files, load_corpus()["fingerprint"]])
+
+
+_TOPIC_SCORE_CACHE = {}
+
+@profiling.profiled("load_topic_score_index")
+def load_topic_score_index(path=TOPIC_SCORE_FOLDER, score_file=TOPIC_SCORE_FILE):
+    """The TopicScoreIndex of the score files, rebuilt only when a score file or the corpus changed."""
+    fingerprint = _topic_score_fingerprint(path)
+    key = (str(path), str(score_file))
+    cached = _TOPIC_SCORE_CACHE.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        profiling.count(items=len(cached[1].sids), hits=1)
+        return cached[1]
+
+    columns = None
+    if Path(score_file).exists():
+        with np.load(score_file) as npz:
+            if str(npz["fingerprint"]) == fingerprint:
+                columns = {k: npz[k] for k in npz.files}
+    profiling.count(hits=columns is not None, misses=columns is None)
+    if columns is None:
+        columns = build_topic_score_index(path, score_file, fingerprint)
+    profiling.count(items=len(columns["sids"]))
+
+    index = TopicScoreIndex(columns["sids"].tolist(), columns["topics"].tolist(), columns["scores"],
+                            columns["dates"], columns["order"], columns["key_order"].tolist())
+    _TOPIC_SCORE_CACHE[key] = (fingerprint, index)
+    return index
 
 
 @functools.lru_cache(maxsize=None)
@@ -124,22 +371,139 @@ def load_speeches_with_embeddings(path=EMBEDDING_FILE):
 
     return raw
 
-def load_rates(path=RATES_FILE):
+# Tenor -> source file in PRICE_DATA_DIR. The swap workbooks have Date / Rate columns,
+# the FRED treasury CSVs observation_date / <series id>.
+RATE_SOURCES = {
+    "FF_12M": "2025-10-26 Fed Funds 12M 6M Historical Swap Rates.xlsx",
+    "FF_24M": "2025-10-26 Fed Funds 24M 6M Historical Swap Rates.xlsx",
+    "FF_5Y": "2025-10-26 Fed Funds 5Y 6M Historical Swap Rates.xlsx",
+    "FF_10Y": "2025-10-26 Fed Funds 10Y 6M Historical Swap Rates.xlsx",
+    "USD_12M": "2025-10-26 USD 12M Historical Swap Rates.xlsx",
+    "USD_24M": "2025-10-26 USD 24M Historical Swap Rates.xlsx",
+    "USD_5Y": "2025-10-26 USD 5Y Historical Swap Rates.xlsx",
+    "USD_10Y": "2025-10-26 USD 10Y Historical Swap Rates.xlsx",
+    "DGS1": "DGS1.csv",
+    "DGS2": "DGS2.csv",
+    "DGS5": "DGS5.csv",
+    "DGS10": "DGS10.csv",
+}
+RATES_TENOR = "FF_12M"
+
+
+def _read_rate_source(source):
+    """One source file as a float series indexed by observation day."""
+    if source.suffix == ".csv":
+        df = pd.read_csv(source)
+        dates, values = df.iloc[:, 0], df.iloc[:, 1]
+    else:
+        df = pd.read_excel(source, usecols=["Date", "Rate"])
+        dates, values = df["Date"], df["Rate"]
+    # workbook timestamps (23:59:59, or intraday for the latest row) count for their calendar day
+    index = pd.DatetimeIndex(pd.to_datetime(dates)).normalize()
+    series = pd.Series(pd.to_numeric(values, errors="coerce").to_numpy(), index=index)
+    return series.groupby(level=0).last().dropna()
+
+
+def _rate_panel_fingerprint(price_dir):
+    entries = []
+    for tenor, name in RATE_SOURCES.items():
+        st = os.stat(Path(price_dir) / name)
+        entries.append([tenor, name, st.st_size, st.st_mtime_ns])
+    return json.dumps(entries)
+
+
+def build_rate_panel(price_dir=PRICE_DATA_DIR, panel_file=RATE_PANEL_FILE, fingerprint=None):
+    """
+    Ingest every RATE_SOURCES file into one business-day x tenor float64 panel (NaN where a tenor
+    has no observation that day) and cache it as .npz.
+    """
+    series = {tenor: _read_rate_source(Path(price_dir) / name) for tenor, name in RATE_SOURCES.items()}
+    start = min(s.index.min() for s in series.values())
+    end = max(s.index.max() for s in series.values())
+    days = pd.bdate_range(start, end)
+
+    values = np.column_stack([s.reindex(days).to_numpy(dtype=np.float64) for s in series.values()])
+    columns = {
+        "dates": days.to_numpy().astype("datetime64[D]"),
+        "tenors": np.array(list(series), dtype=str),
+        "values": values,
+        "fingerprint": np.array(fingerprint or _rate_panel_fingerprint(price_dir)),
+    }
 
-    df = pd.read_excel(path)
-    df["Date"] = df["Date"].apply(lambda x: str(x).split(" ")[0])
-    df["Date"] = df["Date"].apply(parse_date)
-    df = df.set_index("Date").sort_index()
-    df = df[["Rate"]]
-    df.index = pd.to_datetime(df.index)
-    df["Rate_Change"] = df["Rate"].diff(FORWARD_DAYS)
+    panel_file = Path(panel_file)
+    panel_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = panel_file.with_suffix(".tmp.npz")
+    np.savez(tmp_file, **columns)
+    os.replace(tmp_file, panel_file)
+    return columns
+
+
+_RATE_PANEL_CACHE = {}
+
+@profiling.profiled("load_rate_panel")
+def load_rate_panel(tenors=None, price_dir=PRICE_DATA_DIR, panel_file=RATE_PANEL_FILE):
+    """
+    Business-day indexed DataFrame with one column per tenor (default: all of RATE_SOURCES).
+    Excel and CSV files are only read again when one of them changed.
+    """
+    fingerprint = _rate_panel_fingerprint(price_dir)
+    key = (str(price_dir), str(panel_file))
+    cached = _RATE_PANEL_CACHE.get(key)
+    if cached is None or cached[0] != fingerprint:
+        columns = None
+        if Path(panel_file).exists():
+            with np.load(panel_file) as npz:
+                if str(npz["fingerprint"]) == fingerprint:
+                    columns = {k: npz[k] for k in npz.files}
+        profiling.count(hits=columns is not None, misses=columns is None)
+        if columns is None:
+            columns = build_rate_panel(price_dir, panel_file, fingerprint)
+        panel = pd.DataFrame(columns["values"], columns=columns["tenors"].tolist(),
+                             index=pd.DatetimeIndex(columns["dates"].astype("datetime64[ns]"), name="Date"))
+        cached = (fingerprint, panel)
+        _RATE_PANEL_CACHE[key] = cached
+    else:
+        profiling.count(hits=1)
 
-    speech_by_dates = group_speeches_by_date(load_speeches())
-    dates = pd.to_datetime(list(speech_by_dates.keys()))
+    panel = cached[1]
+    profiling.count(items=len(panel))
+    return panel.copy() if tenors is None else panel[list(tenors)].copy()
+
+
+def rate_changes(panel, forward_days=FORWARD_DAYS, forward=False):
+    """
+    Per tenor, the change over forward_days observations of that tenor (days it has no quote are
+    skipped): rate[t] - rate[t - forward_days] like load_rates' Rate_Change, or, with forward=True,
+    rate[t + forward_days] - rate[t]. Computed column by column with shift, no Python loop over dates.
+    """
+    changes = {}
+    for tenor in panel.columns:
+        observed = panel[tenor].dropna()
+        if forward:
+            changes[tenor] = observed.shift(-forward_days) - observed
+        else:
+            changes[tenor] = observed - observed.shift(forward_days)
+    return pd.DataFrame(changes).reindex(panel.index)
+
+
+@profiling.profiled("load_rates")
+def load_rates(tenor=RATES_TENOR, dates=None, forward_days=FORWARD_DAYS):
+    """
+    Rate and Rate_Change (see rate_changes) of one tenor on `dates` (default: every speech date),
+    carrying the last quote forward over days without one.
+    """
+    rates = load_rate_panel([tenor])[tenor].dropna()
+    df = pd.DataFrame({"Rate": rates, "Rate_Change": rates - rates.shift(forward_days)})
+
+    if dates is None:
+        corpus = load_corpus()
+        dates = np.unique(corpus["date"][_corpus_rows_since_start(corpus)])
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
 
     df = df.reindex(df.index.union(dates))
     df = df.ffill()
     df = df.loc[dates]
+    profiling.count(items=len(df))
     return df
 
 def group_speeches_by_date(speeches):
@@ -150,6 +514,49 @@ def group_speeches_by_date(speeches):
     speeches_by_date = dict(sorted(speeches_by_date.items(), key=lambda x: x[0]))
     return speeches_by_date
 
+
+class SpeechTimeIndex:
+    """
+    All speeches sorted by date (one datetime64[D] entry per speech), answering
+    "which speeches fall in [d - lookback_days + 1, d]" with two binary searches.
+    """
+
+    def __init__(self, speeches_by_date):
+        day_counts = [len(sids) for sids in speeches_by_date.values()]
+        days = np.array(list(speeches_by_date.keys()), dtype="datetime64[D]")
+        self.dates = np.repeat(days, day_counts)
+        self.sids = np.array([sid for sids in speeches_by_date.values() for sid in sids], dtype=object)
+
+    def __len__(self):
+        return len(self.sids)
+
+    def bounds(self, target_dates, lookback_days):
+        """[start, end) offsets into self.sids for each target date, vectorized over target_dates."""
+        ends_at = np.asarray(target_dates, dtype="datetime64[D]")
+        starts_at = ends_at - np.timedelta64(lookback_days - 1, "D")
+        starts = np.searchsorted(self.dates, starts_at, side="left")
+        ends = np.searchsorted(self.dates, ends_at, side="right")
+        return starts, ends
+
+    def window(self, target_date, lookback_days):
+        start, end = self.bounds(target_date, lookback_days)
+        return self.sids[start:end].tolist()
+
+    def windows(self, target_dates, lookback_days):
+        starts, ends = self.bounds(target_dates, lookback_days)
+        return [self.sids[s:e].tolist() for s, e in zip(starts, ends)]
+
+    def insert(self, sid, speech_date):
+        """Add one speech after the others of its day, without rebuilding the index."""
+        day = np.datetime64(speech_date, "D")
+        pos = np.searchsorted(self.dates, day, side="right")
+        self.dates = np.insert(self.dates, pos, day)
+        self.sids = np.insert(self.sids, pos, sid)
+
+
+def build_speech_time_index(speeches):
+    return SpeechTimeIndex(group_speeches_by_date(speeches))
+
 # Build global_idx the same way you did before building graphs
 def build_global_indices(speeches, topic_scores, rates_df):
     # 1) Authors
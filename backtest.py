@@ -0,0 +1,204 @@
+"""
+Walk-forward backtest of the topic-score regression baseline (baseline_regression_multi_variables.ipynb).
+
+    python backtest.py                                     # FF_12M, FORWARD_DAYS, expanding window
+    python backtest.py --tenors FF_12M FF_24M DGS2 --horizons 1 5 10 --windows expanding 250 --workers 4
+
+Every speech date is predicted by an OLS fitted only on the rows whose target was already known
+that day, over an expanding window or the last `window` rows. The fits are never redone from
+scratch: X'X and X'y are running sums (one rank-one update per row, a rolling window subtracts the
+rows that fall out), and every topic subset's normal equations are a sub-block of the full ones,
+so a whole grid is a few cumulative sums and batched pseudo-inverses per tenor and horizon.
+"""
+import argparse
+import itertools
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+
+import analysis_utils
+from data_processing import profiling
+
+MIN_TRAIN = 60
+BACKTEST_RESULTS_FILE = "backtest_results.csv"
+
+
+def topic_subsets(topics, max_size=None):
+    """Every non-empty combination of topics, smallest first."""
+    max_size = len(topics) if max_size is None else max_size
+    return [list(c) for k in range(1, max_size + 1) for c in itertools.combinations(topics, k)]
+
+
+def load_targets(dates, tenors=(analysis_utils.RATES_TENOR,), horizons=(analysis_utils.FORWARD_DAYS,),
+                 forward=False):
+    """
+    {(tenor, horizon): (target, known_from)} on `dates`. target is load_rates' Rate_Change for
+    that tenor and forward_days (analysis_utils.rate_changes with forward=True for the change after
+    the date), known_from the first day it can be used for fitting.
+    """
+    dates = pd.DatetimeIndex(dates)
+    panel = analysis_utils.load_rate_panel(list(tenors))
+    targets = {}
+    for horizon in horizons:
+        changes = analysis_utils.rate_changes(panel, horizon, forward=forward)
+        for tenor in tenors:
+            observed = panel[tenor].dropna().index
+            # a backward change is known on its observation day, a forward one `horizon` quotes later
+            known = pd.Series(observed, index=observed)
+            if forward:
+                known = known.shift(-horizon)
+            # the last quote on or before each date, like load_rates
+            target = changes[tenor].loc[observed].reindex(dates, method="ffill").to_numpy()
+            known_from = pd.DatetimeIndex(known.reindex(dates, method="ffill"))
+            # never before the row's own date (speech days without a quote)
+            known_from = np.maximum(known_from.to_numpy(), dates.to_numpy())
+            targets[tenor, horizon] = (target, known_from)
+    return targets
+
+
+def walk_forward(X, y, dates, known_from, subsets, window=None, min_train=MIN_TRAIN):
+    """
+    One-step-ahead OLS predictions with an intercept, shape [len(subsets), n]: row t of subset s is
+    fitted on the columns subsets[s] of the rows known strictly before dates[t] (the last `window`
+    of them, or all of them when window is None). NaN where fewer than min_train rows are known.
+    """
+    n, num_features = X.shape
+    X1 = np.concatenate([np.ones((n, 1)), X], axis=1)
+
+    # running sufficient statistics in the order rows become known
+    order = np.argsort(known_from, kind="stable")
+    Xo, yo = X1[order], y[order]
+    cum_xx = np.zeros((n + 1, num_features + 1, num_features + 1))
+    cum_xy = np.zeros((n + 1, num_features + 1))
+    np.cumsum(Xo[:, :, None] * Xo[:, None, :], axis=0, out=cum_xx[1:])
+    np.cumsum(Xo * yo[:, None], axis=0, out=cum_xy[1:])
+
+    end = np.searchsorted(known_from[order], dates, side="left")
+    start = np.zeros_like(end) if window is None else np.maximum(end - window, 0)
+    A = cum_xx[end] - cum_xx[start]
+    b = cum_xy[end] - cum_xy[start]
+
+    rows = np.flatnonzero(end - start >= min_train)
+    A, b, x = A[rows], b[rows], X1[rows]
+
+    predictions = np.full((len(subsets), n), np.nan)
+    by_size = {}
+    for s, cols in enumerate(subsets):
+        by_size.setdefault(len(cols), []).append(s)
+    for group in by_size.values():
+        cols = np.array([[0] + [1 + c for c in subsets[s]] for s in group])       # [S, p]
+        A_sub = A[:, cols[:, :, None], cols[:, None, :]].transpose(1, 0, 2, 3)  # [S, n, p, p]
+        b_sub = b[:, cols].transpose(1, 0, 2)[..., None]                        # [S, n, p, 1]
+        try:
+            beta = np.linalg.solve(A_sub, b_sub)
+        except np.linalg.LinAlgError:
+            # a constant topic column within some window: minimum-norm solution instead
+            beta = np.linalg.pinv(A_sub) @ b_sub
+        pred = np.einsum("snp,snp->sn", x[:, cols].transpose(1, 0, 2), beta[..., 0])
+        predictions[np.array(group)[:, None], rows] = pred
+    return predictions
+
+
+def _rmse(errors):
+    return float(np.sqrt(np.mean(errors ** 2))) if len(errors) else np.nan
+
+
+_WORKER_STATE = {}
+
+
+def _init_worker(state):
+    _WORKER_STATE.update(state)
+
+
+def _run_target(job):
+    (tenor, horizon), (target, known_from) = job
+    state = _WORKER_STATE
+    X, dates, subsets = state["X"], state["dates"], state["subsets"]
+
+    valid = np.isfinite(target) & np.isfinite(X).all(axis=1)
+    X, y, dates, known_from = X[valid], target[valid], dates[valid], known_from[valid]
+
+    rows = []
+    for window in state["windows"]:
+        predictions = walk_forward(X, y, dates, known_from, state["subset_cols"], window, state["min_train"])
+        for cols, pred in zip(subsets, predictions):
+            scored = np.isfinite(pred)
+            # the zero-change random walk on the same dates
+            rmse, rw_rmse = _rmse(y[scored] - pred[scored]), _rmse(y[scored])
+            rows.append({
+                "tenor": tenor,
+                "horizon": horizon,
+                "window": "expanding" if window is None else window,
+                "topics": ", ".join(cols),
+                "num_topics": len(cols),
+                "n": int(scored.sum()),
+                "rmse": rmse,
+                "rw_rmse": rw_rmse,
+                "ratio": rmse / rw_rmse,
+            })
+    return rows
+
+
+@profiling.profiled("run_backtest")
+def run_backtest(tenors=(analysis_utils.RATES_TENOR,), horizons=(analysis_utils.FORWARD_DAYS,), windows=(None,),
+                 subsets=None, how="last", forward=False, min_train=MIN_TRAIN, num_workers=1):
+    """
+    Walk-forward RMSE of every (tenor, horizon, window, topic subset) against the zero-change
+    random walk, best ratio first. Features are the day's topic scores (TopicScoreIndex.by_date(how),
+    "last" like the notebook); window None is an expanding window, an int the last that many rows.
+    Tenors and horizons are spread over num_workers processes.
+    """
+    scores = analysis_utils.load_topic_score_index().by_date(how)
+    topics = list(scores.columns)
+    subsets = topic_subsets(topics) if subsets is None else [list(cols) for cols in subsets]
+    dates = scores.index
+
+    state = {
+        "X": scores.to_numpy(dtype=np.float64),
+        "dates": dates.to_numpy(),
+        "subsets": subsets,
+        "subset_cols": [[topics.index(t) for t in cols] for cols in subsets],
+        "windows": list(windows),
+        "min_train": min_train,
+    }
+    jobs = list(load_targets(dates, tenors, horizons, forward).items())
+
+    if num_workers <= 1 or len(jobs) <= 1:
+        _WORKER_STATE.update(state)
+        results = [_run_target(job) for job in jobs]
+        _WORKER_STATE.clear()
+    else:
+        start_method = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+        with mp.get_context(start_method).Pool(num_workers, initializer=_init_worker, initargs=(state,)) as pool:
+            results = pool.map(_run_target, jobs)
+
+    df = pd.DataFrame([row for rows in results for row in rows])
+    profiling.count(items=len(df))
+    return df.sort_values(["ratio", "tenor", "horizon"], ignore_index=True)
+
+
+def _parse_window(value):
+    return None if value == "expanding" else int(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tenors", nargs="+", default=[analysis_utils.RATES_TENOR],
+                        choices=list(analysis_utils.RATE_SOURCES))
+    parser.add_argument("--horizons", nargs="+", type=int, default=[analysis_utils.FORWARD_DAYS])
+    parser.add_argument("--windows", nargs="+", type=_parse_window, default=[None],
+                        help='"expanding" and/or rolling window sizes in rows')
+    parser.add_argument("--how", default="last", choices=["mean", "last", "sum"])
+    parser.add_argument("--forward", action="store_true", help="predict the change after each date")
+    parser.add_argument("--min-train", type=int, default=MIN_TRAIN)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--results", default=BACKTEST_RESULTS_FILE)
+    args = parser.parse_args()
+
+    results = run_backtest(args.tenors, args.horizons, args.windows, how=args.how, forward=args.forward,
+                           min_train=args.min_train, num_workers=args.workers)
+    results.to_csv(args.results, index=False)
+    with pd.option_context("display.width", 160, "display.max_colwidth", 60):
+        print(results.head(20).to_string(index=False))
+    print(f"{len(results)} configurations written to {args.results}")
@@ -0,0 +1,387 @@
+"""
+Pipeline benchmarks on the real data and on synthetic Fed-like data at any scale.
+
+    python benchmark.py                              # real data + synthetic 1x, every stage
+    python benchmark.py --datasets 1 10 100          # synthetic 1x / 10x / 100x
+    python benchmark.py --stages load_speeches load_rates --repeat 3
+    python benchmark.py --compare                    # last run against the one before it
+
+Every stage runs in a fresh process whose working directory is the dataset root, so the loaders'
+relative paths (data/..., data/cache/...) resolve to that dataset and peak RSS is the stage's own.
+Results are appended to BENCHMARK_RESULTS_FILE, one JSON record per dataset, stage and repeat.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = Path(__file__).resolve().parent
+BENCH_DATA_DIR = REPO_DIR / "bench_data"
+BENCHMARK_RESULTS_FILE = REPO_DIR / "benchmark_results.jsonl"
+# snapshots built by the build_graphs stage, reused by load_graphs and train_step (relative to the dataset root)
+BENCH_PACK_FILE = Path("data") / "cache" / "bench_graphs.pack"
+GRAPH_DATES = 100
+
+# the real corpus since START_DATE: ~25 authors, ~1000 speeches, 6 topics, 12 rate tenors
+SYNTH_AUTHORS = 25
+SYNTH_SPEECHES = 1000
+SYNTH_TEXT_CHARS = 4000
+SYNTH_START = "2018-06-01"
+SYNTH_END = "2025-10-24"
+TOPICS = ["Fed Funds Rate", "Labor Market", "Inflation", "Real Activity", "Financial Stability", "Balance Sheet"]
+_WORDS = ("inflation policy rate labor market outlook committee balance sheet financial stability growth "
+          "employment prices demand supply risks monetary federal funds target economy percent data").split()
+
+
+# ==========================================================
+# Synthetic data
+# ==========================================================
+
+def make_synthetic_data(root, scale=1, seed=0, text_chars=SYNTH_TEXT_CHARS, emb_dim=768):
+    """
+    Write a Fed-like dataset under root/data in the layout the loaders read: per-author speech
+    files, score_<author>.json tone scores, every RATE_SOURCES file (random walks) and an embedding
+    store plus topic table. scale multiplies the number of authors and speeches over the same history.
+    """
+    import analysis_utils
+    import embedding_utils
+
+    rng = np.random.default_rng(seed)
+    data_dir = Path(root) / "data"
+    text_dir = data_dir / "text_data"
+    score_dir = data_dir / "topic_scores"
+    price_dir = data_dir / "price_data"
+    for folder in [text_dir, score_dir, price_dir]:
+        folder.mkdir(parents=True, exist_ok=True)
+
+    days = pd.bdate_range(SYNTH_START, SYNTH_END)
+    num_authors = max(1, round(SYNTH_AUTHORS * scale))
+    num_speeches = max(1, round(SYNTH_SPEECHES * scale))
+    speech_author = rng.integers(0, num_authors, num_speeches)
+    speech_day = np.sort(rng.integers(0, len(days), num_speeches))
+    vocab = np.array(_WORDS)
+
+    sids = []
+    for a in range(num_authors):
+        author = f"author{a:04d}"
+        speeches, scores = [], []
+        for i in np.flatnonzero(speech_author == a):
+            sid = f"synth:{i}"
+            words = vocab[rng.integers(0, len(vocab), text_chars // 6)]
+            text = " ".join(words)
+            speeches.append({"id": sid, "url": f"https://example.org/{sid}", "text": text, "length": str(len(text)),
+                             "date": days[speech_day[i]].strftime("%Y-%m-%d"), "parsing_from": "html"})
+            scores.append({"id": sid, analysis_utils.SCORE_MODEL:
+                           dict(zip(TOPICS, np.round(rng.uniform(-1, 1, len(TOPICS)), 1).tolist()))})
+            sids.append(sid)
+        with open(text_dir / f"{author}.json", "w", encoding="utf-8") as f:
+            json.dump(speeches, f)
+        with open(score_dir / f"score_{author}.json", "w", encoding="utf-8") as f:
+            json.dump(scores, f)
+
+    # swap workbooks list the newest quote first with end-of-day timestamps, FRED CSVs oldest first
+    for tenor, name in analysis_utils.RATE_SOURCES.items():
+        rates = 2.0 + np.cumsum(rng.normal(0, 0.03, len(days)))
+        if name.endswith(".csv"):
+            pd.DataFrame({"observation_date": days.strftime("%Y-%m-%d"), tenor: np.round(rates, 2)}).to_csv(
+                price_dir / name, index=False)
+        else:
+            pd.DataFrame({"Date": (days + pd.Timedelta(hours=23, minutes=59, seconds=59))[::-1],
+                          "Rate": rates[::-1]}).to_excel(price_dir / name, index=False)
+
+    sids.sort()
+    store_dir = data_dir / "embeddings"
+    embedding_utils.write_embedding_store(sids, rng.standard_normal((len(sids), emb_dim), dtype=np.float32),
+                                          store_dir, model_name=embedding_utils.SENTENCE_MODEL)
+    embedding_utils.write_static_features(TOPICS, rng.standard_normal((len(TOPICS), emb_dim)).astype(np.float32),
+                                          table_dir=store_dir / "static")
+    print(f"Synthetic {scale}x: {num_authors} authors, {num_speeches} speeches in {root}")
+
+
+def dataset_root(dataset, seed=0, text_chars=SYNTH_TEXT_CHARS):
+    """The repository for "real", otherwise bench_data/scale_<n>, generated on first use."""
+    if dataset == "real":
+        return REPO_DIR
+    scale = float(dataset)
+    root = BENCH_DATA_DIR / f"scale_{dataset}"
+    if not (root / "data" / "embeddings").exists():
+        make_synthetic_data(root, scale, seed, text_chars)
+    return root
+
+
+# ==========================================================
+# Stages: setup (not timed) returns (run, unit); run() returns the number of items processed
+# ==========================================================
+
+def _inputs():
+    import analysis_utils
+    speeches = analysis_utils.load_speeches()
+    topic_scores = analysis_utils.load_topic_scores_by_sid()
+    rates_df = analysis_utils.load_rates()
+    return speeches, topic_scores, rates_df
+
+
+def _graph_dates(rates_df, num_dates):
+    dates = sorted(rates_df.index)
+    picks = np.unique(np.linspace(0, len(dates) - 1, min(num_dates, len(dates))).astype(int))
+    return [dates[i] for i in picks]
+
+
+def _iter_graphs(opts):
+    import analysis_utils
+    import embedding_utils
+    import graph_utils
+    speeches, topic_scores, rates_df = _inputs()
+    store = embedding_utils.load_embedding_store()
+    topic_table = embedding_utils.load_static_features()
+    global_idx = analysis_utils.build_global_indices(speeches, topic_scores, rates_df)
+    speech_index = analysis_utils.build_speech_time_index(speeches)
+    for d in _graph_dates(rates_df, opts["graph_dates"]):
+        yield graph_utils.build_graph_for_date(d, speeches, store, topic_scores, rates_df, speech_index, global_idx,
+                                               lookback_days=graph_utils.LOOKBACK_DAYS,
+                                               target_column=graph_utils.TARGET_COLUMN, topic_table=topic_table)
+
+
+def _bench_pack(opts):
+    """
+    Packed snapshots for the loading / training stages, built here when build_graphs has not run.
+    Without an embedding store (the real data on a fresh checkout) the committed graphs_ffr_delta/
+    snapshots are packed instead.
+    """
+    import embedding_utils
+    import graph_dataset
+    if not BENCH_PACK_FILE.exists():
+        BENCH_PACK_FILE.parent.mkdir(parents=True, exist_ok=True)
+        if not Path(embedding_utils.EMBEDDING_STORE_DIR).exists() and Path("graphs_ffr_delta").is_dir():
+            graph_dataset.pack_graph_dir("graphs_ffr_delta", BENCH_PACK_FILE)
+        else:
+            graph_dataset.pack_graphs(_iter_graphs(opts), BENCH_PACK_FILE)
+    return BENCH_PACK_FILE
+
+
+def stage_load_speeches(opts):
+    import analysis_utils
+    return (lambda: len(analysis_utils.load_speeches())), "speeches"
+
+
+def stage_load_topic_scores_by_date(opts):
+    import analysis_utils
+    return (lambda: len(analysis_utils.load_topic_scores_by_date())), "dates"
+
+
+def stage_load_rates(opts):
+    import analysis_utils
+    return (lambda: len(analysis_utils.load_rates())), "rows"
+
+
+def stage_build_global_indices(opts):
+    import analysis_utils
+    speeches, topic_scores, rates_df = _inputs()
+
+    def run():
+        analysis_utils.build_global_indices(speeches, topic_scores, rates_df)
+        return len(speeches)
+    return run, "speeches"
+
+
+def stage_build_graphs(opts):
+    import embedding_utils
+    import graph_dataset
+    embedding_utils.load_embedding_store()  # fail here, not in the timed part, without a store
+    BENCH_PACK_FILE.unlink(missing_ok=True)
+
+    def run():
+        # snapshots are packed as they are built, so at most one is held in memory
+        pack = graph_dataset.pack_graphs(_iter_graphs(opts), BENCH_PACK_FILE)
+        return len(graph_dataset.PackedGraphDataset(pack))
+    return run, "graphs"
+
+
+def stage_load_graphs(opts):
+    import graph_dataset
+    pack = _bench_pack(opts)
+
+    def run():
+        dataset = graph_dataset.load_packed_graphs(pack)
+        for i in range(len(dataset)):
+            dataset.get(i)
+        return len(dataset)
+    return run, "graphs"
+
+
+def stage_train_step(opts):
+    import torch
+    from torch_geometric.loader import DataLoader
+
+    import analysis_utils
+    import gnn_utils
+    import graph_dataset
+
+    dataset = graph_dataset.load_packed_graphs(_bench_pack(opts))
+    graphs = [gnn_utils.prepare_graph(dataset.get(i)) for i in dataset.nonempty_indices()]
+    global_idx = analysis_utils.build_global_indices(*_inputs())
+    torch.manual_seed(0)
+    model = gnn_utils.FedSpeechModel(global_idx, hidden_dim=16)
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-4)
+    loader = DataLoader(graphs, batch_size=32, shuffle=False)
+
+    def run():
+        gnn_utils.train_epoch(model, loader, optimizer, "cpu")
+        return len(graphs)
+    return run, "graphs"
+
+
+STAGES = {
+    "load_speeches": stage_load_speeches,
+    "load_topic_scores_by_date": stage_load_topic_scores_by_date,
+    "load_rates": stage_load_rates,
+    "build_global_indices": stage_build_global_indices,
+    "build_graphs": stage_build_graphs,
+    "load_graphs": stage_load_graphs,
+    "train_step": stage_train_step,
+}
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+
+def run_stage(name, opts):
+    """Run one stage in this process (cwd = dataset root) and return its measurements."""
+    setup_start = time.perf_counter()
+    run, unit = STAGES[name](opts)
+    setup_seconds = time.perf_counter() - setup_start
+
+    start = time.perf_counter()
+    items = run()
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": seconds,
+        "setup_seconds": setup_seconds,
+        "items": items,
+        "unit": unit,
+        "throughput": items / seconds if seconds > 0 else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _run_stage_process(name, root, opts):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        result_file = Path(tmp_dir) / "result.json"
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(REPO_DIR), os.environ.get("PYTHONPATH")]))}
+        proc = subprocess.run(
+            [sys.executable, str(REPO_DIR / "benchmark.py"), "--child", name, "--result-file", str(result_file),
+             "--graph-dates", str(opts["graph_dates"])],
+            cwd=root, env=env, capture_output=True, text=True)
+        if proc.returncode != 0 or not result_file.exists():
+            lines = (proc.stderr or proc.stdout).strip().splitlines()
+            return {"skipped": lines[-1] if lines else f"exit code {proc.returncode}"}
+        with open(result_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(datasets=("real", "1"), stages=None, repeat=1, graph_dates=GRAPH_DATES,
+                   results_file=BENCHMARK_RESULTS_FILE, seed=0, text_chars=SYNTH_TEXT_CHARS):
+    """Run every stage on every dataset, print a table and append the records to results_file."""
+    stages = list(stages or STAGES)
+    opts = {"graph_dates": graph_dates}
+    run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+    commit = _git_commit()
+
+    records = []
+    for dataset in datasets:
+        root = dataset_root(dataset, seed, text_chars)
+        for name in stages:
+            for r in range(repeat):
+                result = _run_stage_process(name, root, opts)
+                record = {"run_id": run_id, "commit": commit, "dataset": dataset, "stage": name, "repeat": r,
+                          "graph_dates": graph_dates, **result}
+                records.append(record)
+                _print_record(record)
+
+    with open(results_file, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    print(f"Saved {len(records)} results to {results_file} (run {run_id})")
+    return records
+
+
+def _print_record(record):
+    label = f"{record['dataset']:>6} {record['stage']:<26}"
+    if "skipped" in record:
+        print(f"{label} skipped: {record['skipped']}")
+        return
+    print(f"{label} {record['seconds']:9.3f}s {record['peak_rss_mb']:9.1f} MB "
+          f"{record['throughput'] or 0:12.1f} {record['unit']}/s")
+
+
+def load_results(results_file=BENCHMARK_RESULTS_FILE):
+    if not Path(results_file).exists():
+        return pd.DataFrame()
+    with open(results_file, "r", encoding="utf-8") as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+def compare_runs(run_a=None, run_b=None, results_file=BENCHMARK_RESULTS_FILE):
+    """
+    Best-of-repeats time and peak RSS per dataset and stage for two runs (default: the last two),
+    with the ratio b / a; a ratio above 1 is a regression.
+    """
+    results = load_results(results_file)
+    if "seconds" not in results:
+        raise ValueError(f"No timed results in {results_file}")
+    results = results.dropna(subset=["seconds"])
+    run_ids = sorted(results["run_id"].unique())
+    run_b = run_b or run_ids[-1]
+    run_a = run_a or run_ids[-2]
+
+    best = results.groupby(["run_id", "dataset", "stage"])[["seconds", "peak_rss_mb"]].min()
+    table = best.loc[run_a].join(best.loc[run_b], lsuffix="_a", rsuffix="_b", how="inner")
+    table["time_ratio"] = table["seconds_b"] / table["seconds_a"]
+    table["rss_ratio"] = table["peak_rss_mb_b"] / table["peak_rss_mb_a"]
+    print(f"{run_a} -> {run_b}")
+    print(table.round(3).to_string())
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--datasets", nargs="+", default=["real", "1"], help='"real" and/or synthetic scales')
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=None)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--graph-dates", type=int, default=GRAPH_DATES, help="target dates built per graph stage")
+    parser.add_argument("--results", default=str(BENCHMARK_RESULTS_FILE))
+    parser.add_argument("--text-chars", type=int, default=SYNTH_TEXT_CHARS)
+    parser.add_argument("--compare", nargs="*", metavar="RUN_ID", help="compare two runs (default: the last two)")
+    parser.add_argument("--child", choices=list(STAGES), help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_stage(args.child, {"graph_dates": args.graph_dates})
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+    elif args.compare is not None:
+        compare_runs(*args.compare[:2], results_file=args.results)
+    else:
+        run_benchmarks(args.datasets, args.stages, args.repeat, args.graph_dates, args.results,
+                       text_chars=args.text_chars)
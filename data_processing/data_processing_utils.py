@@ -1,30 +1,37 @@
 from dotenv import load_dotenv
 import io
-import pdfplumber
 from dateutil import parser
 
-import json
 import os
 from tqdm import tqdm
-import requests
 from bs4 import BeautifulSoup
 import re
 
+from data_processing import profiling
+from data_processing.fetch_utils import fetch_url, get_fetcher
+from data_processing.pdf_utils import extract_pdfs, iter_pdf_pages
+from data_processing.speech_store import SpeechStore
+
 load_dotenv()
 fed_prints_api_key = os.getenv("FED_PRINTS_KEY")
+FED_PRINTS_API = "https://fedinprint.org/api"
 
-def query_fed_prints_by_author(author_name):
-
-
-    url = f"https://fedinprint.org/api/author/{author_name}/items"
+def query_fed_prints_page(author_name, limit=100, offset=0):
+    """One page of an author's fedinprint records, newest first."""
+    url = f"{FED_PRINTS_API}/author/{author_name}/items"
     params = {
-        "limit": 10000
+        "limit": limit,
+        "offset": offset
     }
     headers = {
         "x-api-key": fed_prints_api_key
     }
-    response = requests.get(url, params=params, headers=headers)
-    data = response.json()
+    response = fetch_url(url, params=params, headers=headers)
+    return response.json()
+
+def query_fed_prints_by_author(author_name):
+
+    data = query_fed_prints_page(author_name, limit=10000)
     print("Total Records", len(data["records"]))
     return data
 
@@ -34,15 +41,11 @@ def get_author_short_name(author_name):
 
 def get_saved_ids(author_name):
     author_short_name = get_author_short_name(author_name)
-    if not os.path.exists(f"text_data/{author_short_name}.json"):
-        return []
-    with open(f"text_data/{author_short_name}.json", "r", encoding="utf-8") as f:
-        text_data = json.load(f)
-        return list(map(lambda x: x["id"], text_data))
+    return SpeechStore(f"text_data/{author_short_name}.json").ids
 
 def extract_chicagofed_html(url):
 
-    resp = requests.get(url)
+    resp = fetch_url(url)
     resp.raise_for_status()
     soup = BeautifulSoup(resp.text, "html.parser")
 
@@ -83,7 +86,7 @@ def extract_chicagofed_html(url):
 
 def extract_stlouisfed_html(url):
 
-    resp = requests.get(url)
+    resp = fetch_url(url)
     resp.raise_for_status()
     soup = BeautifulSoup(resp.text, "html.parser")
 
@@ -203,8 +206,7 @@ def extract_date(text):
 def download_pdf(url):
     """Download PDF and return bytes (None if fail)."""
     try:
-        r = requests.get(url, timeout=20)
-        r.raise_for_status()
+        r = fetch_url(url, timeout=20)
         return io.BytesIO(r.content)
     except Exception as e:
         print(f"[ERROR] Failed downloading {url}: {e}")
@@ -214,65 +216,53 @@ def download_pdf(url):
 def extract_pdf_text(pdf_bytes):
     """Extract text from PDF bytes using pdfplumber."""
     try:
-        all_pages = []
-        with pdfplumber.open(pdf_bytes) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text() or ""
-                all_pages.append(text)
-        return "\n\n".join(all_pages)
+        return "\n\n".join(iter_pdf_pages(pdf_bytes))
     except Exception as e:
         print("[ERROR] Failed parsing PDF:", e)
         return ""
 
+@profiling.profiled("pdfs_to_json")
 def pdfs_to_json(url_list, output_json="speeches.json"):
 
-    if os.path.exists(output_json):
-        with open(output_json, "r", encoding="utf-8") as f:
-            try:
-                existing_data = json.load(f)
-                if not isinstance(existing_data, list):
-                    existing_data = []
-            except json.JSONDecodeError:
-                existing_data = []
-    else:
-        existing_data = []
-
-    existing_ids = {entry["id"] for entry in existing_data}
+    # append-only: only new entries are written, in fsynced batches, so an interrupted run resumes
+    store = SpeechStore(output_json)
 
-    new_entries = []
-
-    for url_id, url in tqdm(url_list.items(), desc="Processing PDFs"):
-        if url_id in existing_ids:
+    todo = {}
+    for url_id, url in url_list.items():
+        if url_id in store:
             print(f"Skipping {url_id}: already exists in JSON.")
             continue
-
-        pdf_bytes = download_pdf(url)
-        if pdf_bytes is None:
-            continue
-
-        text = extract_pdf_text(pdf_bytes)
-
-        new_entries.append({
-            "id": url_id,
-            "url": url,
-            "text": text,
-            "length": len(text),
-            "date": extract_date(text),
-            "parsing_from": "pdf"
-        })
-
-    combined = existing_data + new_entries
-
-    with open(output_json, "w", encoding="utf-8") as f:
-        json.dump(combined, f, indent=2, ensure_ascii=False)
-
-    print(f"\nAppended {len(new_entries)} new entries → {output_json}")
-    print(f"Total entries now: {len(combined)}")
+        todo[url_id] = url
+
+    # downloads run on the shared fetcher threads and feed a bounded queue of
+    # documents into a process pool for the CPU-bound text extraction; entries are
+    # appended as documents finish, not in url_list order (readers key them by id)
+    downloads = get_fetcher().map(download_pdf, todo.items())
+    pdfs = ((url_id, pdf_bytes) for url_id, pdf_bytes, _ in downloads if pdf_bytes is not None)
+
+    num_new = 0
+    with store:
+        for url_id, text in tqdm(extract_pdfs(pdfs), total=len(todo), desc="Processing PDFs"):
+            store.append({
+                "id": url_id,
+                "url": todo[url_id],
+                "text": text,
+                "length": len(text),
+                "date": extract_date(text),
+                "parsing_from": "pdf"
+            })
+            num_new += 1
+
+    # HTTP cache hits / misses are counted by the fetcher
+    profiling.count(items=num_new)
+    profiling.add(skipped=len(url_list) - len(todo))
+    print(f"\nAppended {num_new} new entries → {output_json}")
+    print(f"Total entries now: {len(store)}")
 
 
 def extract_board_html(url):
 
-    r = requests.get(url)
+    r = fetch_url(url)
     r.raise_for_status()
     soup = BeautifulSoup(r.text, "html.parser")
 
@@ -304,7 +294,7 @@ def extract_board_html(url):
 
 def extract_nyfed_html(url):
 
-    r = requests.get(url)
+    r = fetch_url(url)
     r.raise_for_status()
     soup = BeautifulSoup(r.text, "html.parser")
 
@@ -332,7 +322,7 @@ def extract_nyfed_html(url):
 
 def extract_bostonfed_html(url):
 
-    resp = requests.get(url)
+    resp = fetch_url(url)
     resp.raise_for_status()
     soup = BeautifulSoup(resp.text, "html.parser")
 
@@ -362,69 +352,63 @@ def extract_bostonfed_html(url):
         "length": len(full_text)
     }
 
-def html_speeches_to_json(url_dict, url_type, output_json="speeches.json"):
-
-    if os.path.exists(output_json):
-        with open(output_json, "r", encoding="utf-8") as f:
-            try:
-                existing_data = json.load(f)
-                if not isinstance(existing_data, list):
-                    existing_data = []
-            except json.JSONDecodeError:
-                existing_data = []
-    else:
-        existing_data = []
+def _html_extractor(url_type):
+    extractors = {
+        "newyorkfed": extract_nyfed_html,
+        "federalreserve": extract_board_html,
+        "dallasfed": extract_dallasfed_html,
+        "chicagofed": extract_chicagofed_html,
+        "clevelandfed": extract_clevelandfed_html,
+        "philadelphiafed": extract_philadelphiafed_html,
+        "stlouisfed": extract_stlouisfed_html,
+        "bostonfed": extract_bostonfed_html,
+    }
+    if url_type not in extractors:
+        raise ValueError("Unknown url type")
+    return extractors[url_type]
 
-    existing_ids = {entry["id"] for entry in existing_data}
+@profiling.profiled("html_speeches_to_json")
+def html_speeches_to_json(url_dict, url_type, output_json="speeches.json"):
 
-    new_entries = []
+    # append-only: only new entries are written, in fsynced batches, so an interrupted run resumes
+    store = SpeechStore(output_json)
 
-    for url_id, url in tqdm(url_dict.items(), desc="Processing HTML Speeches"):
+    extract_html = _html_extractor(url_type)
 
-        if url_id in existing_ids:
+    todo = {}
+    for url_id, url in url_dict.items():
+        if url_id in store:
             print(f"Skipping {url_id}: already in JSON.")
             continue
+        todo[url_id] = url
+
+    num_new = 0
+    with store:
+        # entries are appended as pages finish, not in url_dict order (readers key them by id)
+        results = get_fetcher().map(extract_html, todo.items())
+        for url_id, parsed, error in tqdm(results, total=len(todo), desc="Processing HTML Speeches"):
+            if error is not None:
+                print(f"[ERROR] Failed parsing {todo[url_id]}: {error}")
+                continue
+
+            store.append({
+                "id": url_id,
+                "url": todo[url_id],
+                "text": parsed.get("text"),
+                "length": parsed.get("length"),
+                "date": parsed.get("date"),
+                "parsing_from": "html"
+            })
+            num_new += 1
 
-        if url_type == "newyorkfed":
-            parsed = extract_nyfed_html(url)
-        elif url_type == "federalreserve":
-            parsed = extract_board_html(url)
-        elif url_type == "dallasfed":
-            parsed = extract_dallasfed_html(url)
-        elif url_type == "chicagofed":
-            parsed = extract_chicagofed_html(url)
-        elif url_type == "clevelandfed":
-            parsed = extract_clevelandfed_html(url)
-        elif url_type == "philadelphiafed":
-            parsed = extract_philadelphiafed_html(url)
-        elif url_type == "stlouisfed":
-            parsed = extract_stlouisfed_html(url)
-        elif url_type == "bostonfed":
-            parsed = extract_bostonfed_html(url)
-        else:
-            raise ValueError("Unknown url type")
-
-        new_entries.append({
-            "id": url_id,
-            "url": url,
-            "text": parsed.get("text"),
-            "length": parsed.get("length"),
-            "date": parsed.get("date"),
-            "parsing_from": "html"
-        })
-
-    # --- Save ---
-    combined = existing_data + new_entries
-
-    with open(output_json, "w", encoding="utf-8") as f:
-        json.dump(combined, f, indent=2, ensure_ascii=False)
-
-    print(f"\nAppended {len(new_entries)} new HTML entries → {output_json}")
-    print(f"Total entries now: {len(combined)}")
+    profiling.count(items=num_new)
+    profiling.add(skipped=len(url_dict) - len(todo), failed=len(todo) - num_new)
+    print(f"\nAppended {num_new} new HTML entries → {output_json}")
+    print(f"Total entries now: {len(store)}")
 
 
 def extract_dallasfed_html(url):
-    resp = requests.get(url)
+    resp = fetch_url(url)
     resp.raise_for_status()
     soup = BeautifulSoup(resp.text, "html.parser")
 
@@ -461,7 +445,7 @@ def extract_dallasfed_html(url):
 
 
 def extract_clevelandfed_html(url):
-    resp = requests.get(url)
+    resp = fetch_url(url)
     resp.raise_for_status()
     soup = BeautifulSoup(resp.text, "html.parser")
 
@@ -497,7 +481,7 @@ def extract_clevelandfed_html(url):
     }
 
 def extract_philadelphiafed_html(url):
-    resp = requests.get(url)
+    resp = fetch_url(url)
     resp.raise_for_status()
     soup = BeautifulSoup(resp.text, "html.parser")
 
@@ -0,0 +1,113 @@
+import json
+import os
+from datetime import datetime
+
+from data_processing import data_processing_utils
+
+# Paths are relative to the scraping directory, like "text_data/".
+AUTHOR_MAPS_FILE = "../info_folder/author_maps.json"
+SYNC_STATE_FILE = "fedinprint_sync.json"
+PAGE_SIZE = 100
+
+# Per author, the sync state keeps
+#   seen       every record id listed so far (the persistent dedupe set)
+#   pending    records with a speech file that is not in the store yet (failed downloads, retried next run)
+# The API lists records newest first, so a refresh pages until it reaches a seen id and only
+# the records published since the last run are transferred.
+
+
+def load_sync_state(path=SYNC_STATE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_sync_state(state, path=SYNC_STATE_FILE):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def fetch_new_records(author_name, author_state, page_size=PAGE_SIZE, full=False):
+    """Unseen records, newest first: those listed before the first seen one, or all of them with full=True."""
+    seen = set(author_state.get("seen", []))
+    new_records = []
+    listed = set()
+    offset = 0
+    while True:
+        page = data_processing_utils.query_fed_prints_page(author_name, limit=page_size, offset=offset)
+        records = page.get("records", [])
+
+        reached_seen = False
+        for record in records:
+            if record["id"] in seen:
+                reached_seen = True
+                if not full:
+                    break
+                continue
+            # a record published while paging shifts the next page by one: list it only once
+            if record["id"] in listed:
+                continue
+            listed.add(record["id"])
+            new_records.append(record)
+
+        if (reached_seen and not full) or len(records) < page_size:
+            return new_records
+        offset += page_size
+
+
+def sync_author(author_name, author_state, page_size=PAGE_SIZE, full=False):
+    """List the author's new records, scrape their speeches and return the updated author state."""
+    new_records = fetch_new_records(author_name, author_state, page_size, full)
+    records = author_state.get("pending", []) + new_records
+
+    links, remaining = data_processing_utils.retrieve_remaining_ids(author_name, {"records": records})
+
+    author_short_name = data_processing_utils.get_author_short_name(author_name)
+    output_json = f"text_data/{author_short_name}.json"
+    for inst, link_by_inst in links.items():
+        if inst == "pdf":
+            data_processing_utils.pdfs_to_json(link_by_inst, output_json)
+        else:
+            data_processing_utils.html_speeches_to_json(link_by_inst, inst, output_json)
+
+    linked_ids = {url_id for link_by_inst in links.values() for url_id in link_by_inst}
+    saved_ids = data_processing_utils.get_saved_ids(author_name)
+    seen = set(author_state.get("seen", [])) | {record["id"] for record in new_records}
+
+    print(f"{author_name}: {len(new_records)} new records, {remaining} files to fetch")
+    return {
+        "seen": sorted(seen),
+        "pending": [r for r in records if r["id"] in linked_ids and r["id"] not in saved_ids],
+        "synced_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def sync_all_authors(author_maps_file=AUTHOR_MAPS_FILE, state_file=SYNC_STATE_FILE, page_size=PAGE_SIZE,
+                     full=False):
+    """
+    Refresh every author in author_maps.json, one after the other: each author's downloads already
+    run on the shared fetcher's worker pool, which bounds the requests in flight. The state file is
+    rewritten as each author finishes, so an interrupted run keeps the authors already synced.
+    """
+    with open(author_maps_file, "r", encoding="utf-8") as f:
+        author_names = [row["author_key"] for row in json.load(f)]
+
+    state = load_sync_state(state_file)
+
+    for name in author_names:
+        try:
+            author_state = sync_author(name, state.get(name, {}), page_size, full)
+        except Exception as e:
+            print(f"[ERROR] Sync failed for {name}: {e}")
+            continue
+        state[name] = author_state
+        save_sync_state(state, state_file)
+
+    return state
+
+if __name__ == "__main__":
+    # daily refresh, from the scraping directory: python -m data_processing.fedinprint_sync
+    sync_all_authors()
@@ -0,0 +1,194 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from data_processing import profiling
+from data_processing.http_cache import HttpCache, cache_key
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class HostRateLimiter:
+    """Spaces out requests to the same host by at least 1 / requests_per_second, across threads."""
+
+    def __init__(self, requests_per_second=2.0):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, host):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Fetcher:
+    """
+    Shared HTTP client for the scrapers: one pooled requests.Session (keep-alive, so TLS handshakes
+    are reused), bounded concurrency, a per-host rate limit, timeouts and retries with exponential backoff.
+    With an HttpCache, GETs are revalidated against the cached copy and served from disk when unchanged.
+    """
+
+    def __init__(self, max_workers=8, requests_per_second=2.0, max_retries=3, backoff=0.5, timeout=20,
+                 headers=None, cache=None):
+        self.max_workers = max_workers
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+        # one worker pool for every map() call, the size of the connection pool, so concurrent
+        # callers share max_workers connections instead of each bringing their own threads
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(headers or {"User-Agent": "Mozilla/5.0 (cs224w_cb_graph scraper)"})
+
+    def _sleep_before_retry(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = self.backoff * (2 ** attempt) * (1 + random.random())
+        time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        """
+        GET with rate limiting and retries; raises for a final HTTP error like resp.raise_for_status().
+        resp.from_cache tells whether the body came from the HttpCache (offline, or a 304 revalidation).
+        """
+        if self.cache is None or kwargs.get("stream"):
+            resp = self._get(url, **kwargs)
+            resp.from_cache = False
+            return resp
+
+        key = cache_key(url, kwargs.get("params"))
+        cached = self.cache.lookup(key)
+        if self.cache.offline:
+            profiling.count(hits=cached is not None, misses=cached is None)
+            if cached is None:
+                raise requests.ConnectionError(f"{key} is not in the HTTP cache (offline)")
+            return self.cache.response(cached)
+
+        if cached is not None:
+            kwargs["headers"] = {**self.cache.validators(cached), **(kwargs.get("headers") or {})}
+        resp = self._get(url, **kwargs)
+        if resp.status_code == 304 and cached is not None:
+            profiling.count(hits=1)
+            return self.cache.response(cached)
+        profiling.count(misses=1)
+        if resp.status_code == 200:
+            self.cache.store(key, resp)
+        resp.from_cache = False
+        return resp
+
+    def _get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).netloc
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait(host)
+            try:
+                resp = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                self._sleep_before_retry(attempt)
+                continue
+
+            if resp.status_code in RETRY_STATUS and attempt < self.max_retries:
+                self._sleep_before_retry(attempt, resp)
+                continue
+
+            resp.raise_for_status()
+            return resp
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fetcher")
+            return self._pool
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+        self.session.close()
+
+    def map(self, fn, items, max_pending=None):
+        """
+        Run fn(value) for every (key, value) in items on the fetcher's max_workers threads, which
+        every map() call shares: concurrent calls never have more than max_workers in flight together.
+        Yields (key, result, error) as they complete, not in the order of items; error is None on success.
+        Items are submitted lazily, at most max_pending (default 2 * max_workers) ahead of the
+        consumer, so a slow consumer holds back the producers instead of buffering every result.
+        """
+        max_pending = max_pending or 2 * self.max_workers
+        items = iter(items)
+        pool = self._executor()
+        futures = {}
+        try:
+            exhausted = False
+            while futures or not exhausted:
+                while not exhausted and len(futures) < max_pending:
+                    try:
+                        key, value = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    futures[pool.submit(fn, value)] = key
+
+                if not futures:
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = futures.pop(future)
+                    try:
+                        yield key, future.result(), None
+                    except Exception as e:
+                        yield key, None, e
+        finally:
+            # the consumer stopped early: don't leave its queued items to the other callers
+            for future in futures:
+                future.cancel()
+
+
+_default_fetcher = None
+_default_lock = threading.Lock()
+
+
+def get_fetcher():
+    global _default_fetcher
+    with _default_lock:
+        if _default_fetcher is None:
+            _default_fetcher = Fetcher(cache=HttpCache())
+        return _default_fetcher
+
+
+def set_fetcher(fetcher):
+    """
+    Swap the shared fetcher, e.g. for different limits or a local stand-in server. To re-run the parsers
+    from disk after fixing one: set_fetcher(Fetcher(cache=HttpCache(offline=True))).
+    """
+    global _default_fetcher
+    with _default_lock:
+        _default_fetcher = fetcher
+
+
+def fetch_url(url, **kwargs):
+    return get_fetcher().get(url, **kwargs)
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Raw response bodies, content-addressed, next to the scraped text (paths are relative like "text_data/"):
+#   http_cache/blobs/<sha[:2]>/<sha256>   one file per distinct body, shared by every URL that served it
+#   http_cache/index.sqlite               url -> sha256, ETag / Last-Modified validators, size, last access
+HTTP_CACHE_DIR = "http_cache"
+HTTP_CACHE_MAX_BYTES = 5 * 1024 ** 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_type TEXT,
+    encoding TEXT,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+)
+"""
+
+
+def cache_key(url, params=None):
+    """The full request URL, query string included, as requests would send it."""
+    return requests.Request("GET", url, params=params).prepare().url
+
+
+class HttpCache:
+    """
+    On-disk cache of GET responses for the Fetcher. A cached URL is revalidated with
+    If-None-Match / If-Modified-Since, so an unchanged page costs a 304 instead of a download;
+    with offline=True cached bodies are served without touching the network at all.
+    Least recently used entries are evicted once the blobs exceed max_bytes.
+    """
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, max_bytes=HTTP_CACHE_MAX_BYTES, offline=False):
+        self.cache_dir = Path(cache_dir)
+        self.blob_dir = self.cache_dir / "blobs"
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+
+        # one connection shared by the fetcher threads, serialized by the lock
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.cache_dir / "index.sqlite", check_same_thread=False)
+        self.db.execute(_SCHEMA)
+        self.db.commit()
+
+    def _blob_path(self, sha):
+        return self.blob_dir / sha[:2] / sha
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT url, sha256, size, etag, last_modified, content_type, encoding FROM responses WHERE url = ?",
+                (url,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(zip(["url", "sha256", "size", "etag", "last_modified", "content_type", "encoding"], row))
+        if not self._blob_path(entry["sha256"]).exists():
+            return None
+        return entry
+
+    def validators(self, entry):
+        """Conditional request headers for a cached entry."""
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def response(self, entry):
+        """Rebuild a requests.Response from a cached entry (resp.from_cache is True)."""
+        with open(self._blob_path(entry["sha256"]), "rb") as f:
+            body = f.read()
+        with self.lock:
+            self.db.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), entry["url"]))
+            self.db.commit()
+
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.reason = "OK"
+        resp.url = entry["url"]
+        resp._content = body
+        resp.encoding = entry["encoding"]
+        resp.headers = CaseInsensitiveDict({
+            k: v for k, v in [("Content-Type", entry["content_type"]), ("ETag", entry["etag"]),
+                              ("Last-Modified", entry["last_modified"])] if v
+        })
+        resp.from_cache = True
+        return resp
+
+    def store(self, url, resp):
+        body = resp.content
+        sha = hashlib.sha256(body).hexdigest()
+        blob_path = self._blob_path(sha)
+        if not blob_path.exists():
+            blob_path.parent.mkdir(exist_ok=True)
+            tmp_path = blob_path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, blob_path)
+
+        now = time.time()
+        with self.lock:
+            previous = self.db.execute("SELECT sha256 FROM responses WHERE url = ?", (url,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, sha, len(body), resp.headers.get("ETag"), resp.headers.get("Last-Modified"),
+                 resp.headers.get("Content-Type"), resp.encoding, now, now))
+            self.db.commit()
+            # the page changed: its previous body goes unless another URL still serves it
+            if previous is not None and previous[0] != sha:
+                self._drop_blob_if_unused(previous[0])
+            self._evict()
+
+    def _drop_blob_if_unused(self, sha):
+        shared = self.db.execute("SELECT 1 FROM responses WHERE sha256 = ? LIMIT 1", (sha,)).fetchone()
+        if shared is None:
+            self._blob_path(sha).unlink(missing_ok=True)
+        return shared is None
+
+    def total_bytes(self):
+        with self.lock:
+            return self._total_bytes()
+
+    def _total_bytes(self):
+        row = self.db.execute("SELECT SUM(size) FROM (SELECT MAX(size) AS size FROM responses GROUP BY sha256)")
+        return row.fetchone()[0] or 0
+
+    def _evict(self):
+        """Drop least recently used entries, and blobs no entry refers to any more, down to 90% of max_bytes."""
+        if not self.max_bytes or self._total_bytes() <= self.max_bytes:
+            return
+        target = 0.9 * self.max_bytes
+        total = self._total_bytes()
+        for url, sha, size in self.db.execute(
+                "SELECT url, sha256, size FROM responses ORDER BY accessed_at").fetchall():
+            if total <= target:
+                break
+            self.db.execute("DELETE FROM responses WHERE url = ?", (url,))
+            if self._drop_blob_if_unused(sha):
+                total -= size
+        self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
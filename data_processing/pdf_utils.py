@@ -0,0 +1,126 @@
+import io
+import multiprocessing as mp
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import pdfplumber
+
+PDF_TIMEOUT = 120  # seconds of extraction per document
+
+
+class _Deadline(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _Deadline()
+
+
+def iter_pdf_pages(pdf_bytes):
+    """Yield the text of each page; a page's layout objects are released before the next one is parsed."""
+    if isinstance(pdf_bytes, (bytes, bytearray)):
+        pdf_bytes = io.BytesIO(pdf_bytes)
+    with pdfplumber.open(pdf_bytes) as pdf:
+        for page in pdf.pages:
+            text = page.extract_text() or ""
+            page.close()
+            yield text
+
+
+def extract_pdf_text_with_deadline(pdf_bytes, timeout=PDF_TIMEOUT):
+    """
+    Text of the pages extracted within `timeout` seconds. Where SIGALRM exists (Linux/macOS workers)
+    a single hung page is interrupted too; elsewhere the deadline is checked between pages.
+    """
+    pages = []
+    deadline = time.monotonic() + timeout
+    use_alarm = timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        for text in iter_pdf_pages(pdf_bytes):
+            pages.append(text)
+            if timeout and time.monotonic() > deadline:
+                raise _Deadline()
+    except _Deadline:
+        print(f"[ERROR] PDF extraction timed out after {timeout}s, kept {len(pages)} pages")
+    except Exception as e:
+        print("[ERROR] Failed parsing PDF:", e)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+    return "\n\n".join(pages)
+
+
+def extract_pdfs(pdf_items, num_workers=None, max_pending=None, timeout=PDF_TIMEOUT):
+    """
+    Extract text from (key, pdf_bytes) pairs in a process pool; yields (key, text) as documents finish.
+    At most max_pending documents (default 2 * num_workers) are queued, so pdf_items, typically a
+    download generator, is only pulled as fast as the workers keep up.
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * num_workers
+    pdf_items = iter(pdf_items)
+
+    # the download threads are already running, so don't fork this process
+    start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+    ctx = mp.get_context(start_method)
+
+    pool = ProcessPoolExecutor(num_workers, mp_context=ctx)
+    futures = {}
+    # documents in flight when a worker died: each gets one more try, alone in a fresh pool,
+    # so a second crash is pinned on the document that caused it
+    retry = []
+    exhausted = False
+    try:
+        while True:
+            while len(futures) < max_pending:
+                if retry:
+                    if not futures:
+                        key, pdf_bytes, attempt = retry.pop()
+                        future = pool.submit(extract_pdf_text_with_deadline, pdf_bytes, timeout)
+                        futures[future] = (key, pdf_bytes, attempt)
+                    break
+                if exhausted:
+                    break
+                try:
+                    key, pdf_bytes = next(pdf_items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if isinstance(pdf_bytes, io.BytesIO):
+                    pdf_bytes = pdf_bytes.getvalue()
+                futures[pool.submit(extract_pdf_text_with_deadline, pdf_bytes, timeout)] = (key, pdf_bytes, 0)
+
+            if not futures:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                key, pdf_bytes, attempt = futures.pop(future)
+                try:
+                    yield key, future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    if attempt == 0:
+                        retry.append((key, pdf_bytes, 1))
+                    else:
+                        print(f"[ERROR] PDF {key} crashed the extraction worker twice, skipping")
+                        yield key, ""
+                except Exception as e:
+                    print(f"[ERROR] Failed parsing PDF {key}: {e}")
+                    yield key, ""
+
+            if broken:
+                for key, pdf_bytes, attempt in futures.values():
+                    retry.append((key, pdf_bytes, 1))
+                futures = {}
+                pool.shutdown(cancel_futures=True)
+                pool = ProcessPoolExecutor(num_workers, mp_context=ctx)
+    finally:
+        pool.shutdown(cancel_futures=True)
@@ -0,0 +1,227 @@
+"""
+Opt-in stage instrumentation. Off unless enabled, in which case every instrumented stage appends one
+JSON record to a trace file:
+
+    profiling.enable("trace.jsonl")       # or set CB_GRAPH_PROFILE=trace.jsonl before starting Python
+    ... load, build, train ...
+    profiling.report("trace.jsonl")       # or: python -m data_processing.profiling trace.jsonl
+
+A stage record holds wall and CPU time, the process' peak RSS (and how much the stage raised it),
+item counts and cache hits / misses; events (per snapshot sizes, per batch timings) are single
+records with their own fields. The path is exported through the environment, so worker processes
+started afterwards write to the same trace.
+"""
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+PROFILE_ENV = "CB_GRAPH_PROFILE"
+
+_LOCK = threading.Lock()
+_STATE = {"path": None, "file": None, "pid": None}
+# open stages of this process, innermost last; counts from any thread go to the innermost one
+_STACK = []
+
+
+def enable(path):
+    os.environ[PROFILE_ENV] = str(path)
+
+
+def disable():
+    os.environ.pop(PROFILE_ENV, None)
+
+
+def enabled():
+    return bool(os.environ.get(PROFILE_ENV))
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+
+def _write(record):
+    path = os.environ.get(PROFILE_ENV)
+    if not path:
+        return
+    line = json.dumps(record, default=str) + "\n"
+    with _LOCK:
+        # reopen after a fork or a change of trace file; one write per line keeps lines from
+        # different processes whole (the file is opened in append mode)
+        if _STATE["file"] is None or _STATE["pid"] != os.getpid() or _STATE["path"] != path:
+            _STATE["file"] = open(path, "a", encoding="utf-8", buffering=1)
+            _STATE["path"], _STATE["pid"] = path, os.getpid()
+        _STATE["file"].write(line)
+
+
+class Stage:
+    """Counters of one open stage; see stage()."""
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.items = 0
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, items=0, hits=0, misses=0):
+        with _LOCK:
+            self.items += items
+            self.hits += hits
+            self.misses += misses
+
+    def add(self, **fields):
+        self.fields.update(fields)
+
+
+class _NullStage:
+    def count(self, items=0, hits=0, misses=0):
+        pass
+
+    def add(self, **fields):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+@contextmanager
+def stage(name, **fields):
+    """
+    Time the enclosed block as stage `name`. Yields a Stage whose count()/add() attach item counts,
+    cache hits / misses and extra fields to the record; a no-op when profiling is off.
+    """
+    if not enabled():
+        yield _NULL_STAGE
+        return
+
+    st = Stage(name, dict(fields))
+    with _LOCK:
+        parent = "/".join(s.name for s in _STACK)
+        _STACK.append(st)
+    rss_before = _peak_rss_mb()
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    try:
+        yield st
+    finally:
+        wall = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+        with _LOCK:
+            _STACK.remove(st)
+        rss = _peak_rss_mb()
+        lookups = st.hits + st.misses
+        _write({
+            "type": "stage", "name": name, "parent": parent, "pid": os.getpid(), "ts": time.time(),
+            "wall_s": wall, "cpu_s": cpu, "peak_rss_mb": rss, "peak_rss_delta_mb": rss - rss_before,
+            "items": st.items, "cache_hits": st.hits, "cache_misses": st.misses,
+            "cache_hit_rate": st.hits / lookups if lookups else None,
+            **st.fields,
+        })
+
+
+def profiled(name):
+    """Decorator form of stage(name); the function reports counts through profiling.count()."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(items=0, hits=0, misses=0):
+    """Add to the innermost open stage (no-op when profiling is off or no stage is open)."""
+    if not _STACK:
+        return
+    _STACK[-1].count(items, hits, misses)
+
+
+def add(**fields):
+    """Attach fields to the innermost open stage's record."""
+    if not _STACK:
+        return
+    _STACK[-1].add(**fields)
+
+
+def event(name, **fields):
+    if not enabled():
+        return
+    parent = "/".join(s.name for s in _STACK)
+    _write({"type": "event", "name": name, "parent": parent, "pid": os.getpid(), "ts": time.time(), **fields})
+
+
+def load_trace(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+def summarize(path):
+    """
+    Per stage: calls, total / mean / max wall time, CPU time, the highest peak RSS and the largest
+    increase a single call caused, items and throughput, and the cache hit rate.
+    """
+    trace = load_trace(path)
+    stages = trace[trace["type"] == "stage"]
+    if stages.empty:
+        return pd.DataFrame()
+    summary = stages.groupby("name").agg(
+        calls=("wall_s", "size"),
+        wall_s=("wall_s", "sum"),
+        mean_wall_s=("wall_s", "mean"),
+        max_wall_s=("wall_s", "max"),
+        cpu_s=("cpu_s", "sum"),
+        peak_rss_mb=("peak_rss_mb", "max"),
+        max_rss_delta_mb=("peak_rss_delta_mb", "max"),
+        items=("items", "sum"),
+        cache_hits=("cache_hits", "sum"),
+        cache_misses=("cache_misses", "sum"),
+    )
+    summary["items_per_s"] = summary["items"] / summary["wall_s"].where(summary["wall_s"] > 0)
+    lookups = summary["cache_hits"] + summary["cache_misses"]
+    summary["cache_hit_rate"] = summary["cache_hits"] / lookups.where(lookups > 0)
+    return summary.sort_values("wall_s", ascending=False)
+
+
+_STAGE_COLUMNS = ["ts", "pid", "wall_s", "cpu_s", "peak_rss_mb", "peak_rss_delta_mb", "items",
+                  "cache_hits", "cache_misses", "cache_hit_rate"]
+
+
+def summarize_fields(path, record_type="event"):
+    """
+    Mean, max and sum of every numeric field per name: event fields (per batch timings, ...) or,
+    with record_type="stage", the extra fields stages attach (per snapshot node / edge counts, ...).
+    """
+    trace = load_trace(path)
+    records = trace[trace["type"] == record_type]
+    records = records.drop(columns=[c for c in _STAGE_COLUMNS if c in records]).dropna(axis=1, how="all")
+    numeric = list(records.select_dtypes("number").columns)
+    records = records.dropna(subset=numeric, how="all")
+    if records.empty or not numeric:
+        return pd.DataFrame()
+    return records.groupby("name")[numeric].agg(["mean", "max", "sum"]).dropna(axis=1, how="all")
+
+
+def report(path):
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(f"Stages in {path}")
+        print(summarize(path).round(3).to_string())
+        for title, record_type in [("Stage fields", "stage"), ("Events", "event")]:
+            fields = summarize_fields(path, record_type)
+            if not fields.empty:
+                print(f"\n{title}")
+                # one row per name and field
+                print(fields.stack(level=0, future_stack=True).dropna(how="all").round(4).to_string())
+
+
+if __name__ == "__main__":
+    report(sys.argv[1] if len(sys.argv) > 1 else os.environ.get(PROFILE_ENV, "trace.jsonl"))
@@ -0,0 +1,219 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+# Per-author layout, next to the existing file:
+#   <author>.json      compacted base (a JSON list, what every reader already understands)
+#   <author>.jsonl     append-only log of entries scraped since the last compaction
+#   <author>.idx.json  ids of the base file, so opening the store never re-parses it
+#   <author>.jsonl.compacting  the log while compact() folds it into the base file
+# Appends cost O(new data); compact() folds the log back into the base file atomically.
+
+
+def _log_path(output_json):
+    return Path(output_json).with_suffix(".jsonl")
+
+
+def _compacting_path(output_json):
+    return Path(output_json).with_suffix(".jsonl.compacting")
+
+
+def _index_path(output_json):
+    return Path(output_json).with_suffix(".idx.json")
+
+
+def _fingerprint(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _read_base(output_json):
+    if not os.path.exists(output_json):
+        return []
+    with open(output_json, "r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            # never treat a damaged base as empty: the next compaction would overwrite it
+            raise ValueError(f"{output_json} is not valid JSON: {e}") from e
+    if not isinstance(data, list):
+        raise ValueError(f"{output_json} does not hold a list of entries")
+    return data
+
+
+def _read_lines(log_path, repair=False):
+    """
+    Entries of one JSON-lines file. A torn last line (crash mid-write) is ignored, or cut off when repair=True.
+    """
+    if not log_path.exists():
+        return []
+
+    entries = []
+    good_bytes = 0
+    with open(log_path, "rb") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+            if not line.endswith(b"\n"):
+                entries.pop()
+                break
+            good_bytes += len(line)
+
+    if repair and good_bytes < log_path.stat().st_size:
+        with open(log_path, "r+b") as f:
+            f.truncate(good_bytes)
+    return entries
+
+
+def _read_compacting(output_json):
+    """Entries of an interrupted compaction that did not reach the base file."""
+    entries = _read_lines(_compacting_path(output_json))
+    # the base file is replaced atomically: it holds either all of them or none
+    if entries and entries[0]["id"] in _base_ids(output_json):
+        return []
+    return entries
+
+
+def read_log(output_json, repair=False):
+    """
+    Entries not yet in the base file: those of an interrupted compaction, then the append log.
+    A torn last line (crash mid-write) is ignored, or cut off when repair=True.
+    """
+    return _read_compacting(output_json) + _read_lines(_log_path(output_json), repair)
+
+
+def read_entries(output_json):
+    """Base entries followed by logged ones: the full content of the store."""
+    return _read_base(output_json) + read_log(output_json)
+
+
+def _base_ids(output_json):
+    if not os.path.exists(output_json):
+        return set()
+
+    index_path = _index_path(output_json)
+    fingerprint = _fingerprint(output_json)
+    if index_path.exists():
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("fingerprint") == fingerprint:
+            return set(index["ids"])
+
+    ids = [entry["id"] for entry in _read_base(output_json)]
+    _write_index(output_json, ids)
+    return set(ids)
+
+
+def _write_index(output_json, ids):
+    index_path = _index_path(output_json)
+    tmp_path = index_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": _fingerprint(output_json), "ids": list(ids)}, f)
+    os.replace(tmp_path, index_path)
+
+
+class SpeechStore:
+    """
+    Append-only writer for one author's speech file. Entries are buffered and committed to the
+    log every `flush_every` appends (and on close); a committed batch survives a crash, so an
+    interrupted scrape resumes from the ids already in the store.
+    """
+
+    def __init__(self, output_json, flush_every=10):
+        self.output_json = Path(output_json)
+        self.flush_every = flush_every
+        self.pending = []
+
+        logged = read_log(self.output_json, repair=True)
+        self.ids = _base_ids(self.output_json) | {entry["id"] for entry in logged}
+        self.num_logged = len(logged)
+
+    def __contains__(self, entry_id):
+        return entry_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def append(self, entry):
+        if entry["id"] in self.ids:
+            return False
+        self.ids.add(entry["id"])
+        self.pending.append(entry)
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+        return True
+
+    def flush(self):
+        if not self.pending:
+            return
+        # one write per batch, fsynced: the batch is either fully in the log or not at all
+        payload = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in self.pending)
+        self.output_json.parent.mkdir(parents=True, exist_ok=True)
+        with open(_log_path(self.output_json), "a", encoding="utf-8") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self.num_logged += len(self.pending)
+        self.pending = []
+
+    def compact(self):
+        """Fold the log into <author>.json (written to a temp file, then renamed) and drop the log."""
+        self.flush()
+        compact(self.output_json)
+        self.num_logged = 0
+
+
+def _fold(output_json):
+    """Append the entries of <author>.jsonl.compacting to the base file, then remove it."""
+    pending = _read_compacting(output_json)
+    if pending:
+        combined = _read_base(output_json) + pending
+        tmp_path = output_json.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(combined, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, output_json)
+        _write_index(output_json, [entry["id"] for entry in combined])
+    _compacting_path(output_json).unlink()
+    return len(pending)
+
+
+def compact(output_json):
+    """
+    Fold the log into the base file. The log is renamed away first, so every entry is always in
+    exactly one place: a crash at any step is finished by the next compact() and never applies
+    the log twice.
+    """
+    output_json = Path(output_json)
+    num_compacted = 0
+    if _compacting_path(output_json).exists():
+        num_compacted += _fold(output_json)
+    if _log_path(output_json).exists():
+        os.replace(_log_path(output_json), _compacting_path(output_json))
+        num_compacted += _fold(output_json)
+    return num_compacted
+
+
+def compact_folder(folder):
+    # authors with a log, or with a compaction a crash left unfinished
+    folder = Path(folder)
+    bases = {log_path.with_suffix(".json") for log_path in folder.glob("*.jsonl")}
+    bases |= {path.with_suffix("").with_suffix(".json") for path in folder.glob("*.jsonl.compacting")}
+    for output_json in sorted(bases):
+        n = compact(output_json)
+        print(f"{output_json.stem}: compacted {n} entries")
+
+
+if __name__ == "__main__":
+    # python -m data_processing.speech_store text_data
+    compact_folder(sys.argv[1] if len(sys.argv) > 1 else "text_data")
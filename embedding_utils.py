@@ -0,0 +1,346 @@
+import hashlib
+import json
+import multiprocessing as mp
+import os
+from pathlib import Path
+
+import numpy as np
+
+import analysis_utils
+from data_processing import profiling
+
+SENTENCE_MODEL = "all-mpnet-base-v2"
+
+EMBEDDING_STORE_DIR = analysis_utils.DATA_DIR / "embeddings"
+# Stores written before matrices were named by content have no "matrix" entry in their index
+MATRIX_FILE = "embeddings.npy"
+MATRIX_FILE_PATTERN = "embeddings-{}.npy"
+INDEX_FILE = "index.json"
+STATIC_FEATURE_DIR = EMBEDDING_STORE_DIR / "static"
+EMBED_BATCH_SIZE = 32
+# How a speech vector is made from its text, recorded in index.json next to the model: vectors
+# pooled another way (or over other chunk sizes) are not comparable and are never mixed in one store
+POOLING = "chunked-token-weighted-mean"
+
+
+class EmbeddingStore:
+    """
+    Speech embeddings as one memory-mapped [num_speeches, dim] matrix plus a sid -> row index.
+    Rows are gathered by index; nothing is copied until get() is called.
+    """
+
+    def __init__(self, matrix, sids, model_name=None, store_dir=None, pooling=None, chunk_tokens=None):
+        self.matrix = matrix
+        self.sids = list(sids)
+        self.sid2row = {sid: i for i, sid in enumerate(self.sids)}
+        self.model_name = model_name
+        self.store_dir = store_dir
+        self.pooling = pooling
+        self.chunk_tokens = chunk_tokens
+
+    def __reduce__(self):
+        # Re-open the memory map in the receiving process instead of pickling the matrix
+        if self.store_dir is not None:
+            return load_embedding_store, (self.store_dir,)
+        return EmbeddingStore, (np.asarray(self.matrix), self.sids, self.model_name, None, self.pooling,
+                                self.chunk_tokens)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def __len__(self):
+        return len(self.sids)
+
+    def __contains__(self, sid):
+        return sid in self.sid2row
+
+    def rows(self, sids):
+        return np.fromiter((self.sid2row[sid] for sid in sids), dtype=np.int64, count=len(sids))
+
+    def get(self, sids, dtype=np.float32):
+        """Embeddings of `sids` in order, shape [len(sids), dim]."""
+        return np.asarray(self.matrix[self.rows(sids)], dtype=dtype)
+
+
+def write_embedding_store(sids, matrix, store_dir=EMBEDDING_STORE_DIR, dtype="float32", model_name=None,
+                          pooling=None, chunk_tokens=None):
+    """
+    Write `matrix` (row i belongs to sids[i]) as an .npy matrix + index.json, which also records
+    the model and the pooling scheme (POOLING, over chunks of chunk_tokens tokens) the rows come from.
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+
+    matrix = np.ascontiguousarray(matrix, dtype=dtype)
+    if matrix.shape[0] != len(sids):
+        raise ValueError(f"{matrix.shape[0]} embedding rows for {len(sids)} speech ids")
+
+    # The matrix goes to a new file named by its content and the index, which names it, is replaced
+    # last: until then readers still get the previous index and matrix, after it the new pair
+    digest = hashlib.sha1(json.dumps(list(sids)).encode("utf-8"))
+    digest.update(matrix.tobytes())
+    matrix_file = MATRIX_FILE_PATTERN.format(digest.hexdigest()[:16])
+    tmp_matrix = store_dir / (matrix_file + ".tmp")
+    with open(tmp_matrix, "wb") as f:
+        np.save(f, matrix)
+    os.replace(tmp_matrix, store_dir / matrix_file)
+
+    tmp_index = store_dir / (INDEX_FILE + ".tmp")
+    with open(tmp_index, "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, "pooling": pooling, "chunk_tokens": chunk_tokens, "dtype": str(matrix.dtype),
+                   "dim": int(matrix.shape[1]), "matrix": matrix_file, "sids": list(sids)}, f)
+    os.replace(tmp_index, store_dir / INDEX_FILE)
+
+    # Matrices of previous writes (a reader may still have one memory-mapped, where it can't be removed)
+    for old in [store_dir / MATRIX_FILE, *store_dir.glob(MATRIX_FILE_PATTERN.format("*"))]:
+        if old.name != matrix_file and old.exists():
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+def load_embedding_store(store_dir=EMBEDDING_STORE_DIR):
+    store_dir = Path(store_dir)
+    with open(store_dir / INDEX_FILE, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    matrix = np.load(store_dir / index.get("matrix", MATRIX_FILE), mmap_mode="r")
+    return EmbeddingStore(matrix, index["sids"], model_name=index.get("model"), store_dir=str(store_dir),
+                          pooling=index.get("pooling"), chunk_tokens=index.get("chunk_tokens"))
+
+
+def convert_embeddings_json(json_path=analysis_utils.EMBEDDING_FILE, store_dir=EMBEDDING_STORE_DIR,
+                            dtype="float32", model_name=SENTENCE_MODEL):
+    """
+    One-off migration of speeches_with_embeddings.json into the binary store. Those vectors are one
+    pass over each text, truncated at max_seq_length, so embed_speeches will not extend the store:
+    it re-embeds everything instead.
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+
+    sids = sorted(raw.keys())
+    matrix = np.array([raw[sid]["embedding"] for sid in sids], dtype=dtype)
+    write_embedding_store(sids, matrix, store_dir, dtype=dtype, model_name=model_name, pooling="truncated")
+    return load_embedding_store(store_dir)
+
+
+# ==========================================================
+# Speech embedding job: chunked, length-bucketed, incremental
+# ==========================================================
+
+def _load_sentence_model(model_name):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, device="cpu")
+
+
+def chunk_text(text, tokenizer, max_tokens):
+    """
+    Split text at token boundaries into pieces the model reads in full (it truncates anything
+    past max_seq_length). Returns (chunk, num_tokens) pairs; short texts come back whole.
+    """
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)["offset_mapping"]
+    if len(offsets) <= max_tokens:
+        return [(text, len(offsets))]
+    chunks = []
+    for start in range(0, len(offsets), max_tokens):
+        piece = offsets[start:start + max_tokens]
+        chunks.append((text[piece[0][0]:piece[-1][1]], len(piece)))
+    return chunks
+
+
+def embed_text(text, model):
+    """
+    One speech embedded the way embed_speeches does it (token-weighted mean of its chunks,
+    L2-normalized; zeros without text), for speeches that arrive one at a time.
+    """
+    dim = model.get_sentence_embedding_dimension()
+    text = (text or "").strip()
+    if text == "":
+        return np.zeros(dim, dtype=np.float32)
+    chunks = chunk_text(text, model.tokenizer, model.max_seq_length - 2)
+    embeddings = np.asarray(model.encode([chunk for chunk, _ in chunks], show_progress_bar=False), dtype=np.float32)
+    pooled = (embeddings * np.array([n for _, n in chunks], dtype=np.float32)[:, None]).sum(axis=0)
+    norm = np.linalg.norm(pooled)
+    return pooled / norm if norm > 0 else pooled
+
+
+_EMBED_STATE = {}
+
+
+def _init_embed_worker(model_name, num_threads):
+    import torch
+    torch.set_num_threads(num_threads)
+    _EMBED_STATE["model"] = _load_sentence_model(model_name)
+
+
+def _encode_batch(job):
+    batch_id, texts = job
+    model = _EMBED_STATE["model"]
+    embeddings = model.encode(texts, batch_size=len(texts), show_progress_bar=False)
+    return batch_id, np.asarray(embeddings, dtype=np.float32)
+
+
+def _encode_batches(jobs, model, model_name, num_workers):
+    """Yields (batch_id, embeddings); with num_workers > 1 each worker process holds its own model."""
+    if num_workers <= 1:
+        _EMBED_STATE["model"] = model
+        try:
+            for job in jobs:
+                yield _encode_batch(job)
+        finally:
+            _EMBED_STATE.clear()
+        return
+
+    # torch thread pools don't survive fork, start clean interpreters
+    start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+    ctx = mp.get_context(start_method)
+    num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+    with ctx.Pool(num_workers, initializer=_init_embed_worker, initargs=(model_name, num_threads)) as pool:
+        yield from pool.imap_unordered(_encode_batch, jobs)
+
+
+@profiling.profiled("embed_speeches")
+def embed_speeches(speeches=None, model_name=SENTENCE_MODEL, store_dir=EMBEDDING_STORE_DIR, num_workers=1,
+                   batch_size=EMBED_BATCH_SIZE, dtype="float32", force=False):
+    """
+    Embed the speeches missing from the store at store_dir and write the merged store.
+
+    Long speeches are split into max_seq_length chunks whose embeddings are averaged (weighted by
+    token count) and L2-normalized, like the model's own outputs. All chunks are sorted by length
+    and batched, so a batch pads to similar lengths, and batches are spread over num_workers
+    processes. Speeches without text get a zero vector, as before. A store built with another
+    model, pooled another way (e.g. convert_embeddings_json's truncated vectors) or over other
+    chunk sizes, or force=True, re-embeds everything.
+    """
+    if speeches is None:
+        speeches = analysis_utils.load_speeches()
+
+    store = None
+    if not force and (Path(store_dir) / INDEX_FILE).exists():
+        store = load_embedding_store(store_dir)
+        if store.model_name != model_name:
+            print(f"Store was built with {store.model_name}, re-embedding everything with {model_name}")
+            store = None
+        elif store.pooling != POOLING:
+            print(f"Store holds {store.pooling or 'unrecorded'} embeddings, re-embedding everything with {POOLING}")
+            store = None
+
+    missing = sorted(sid for sid in speeches if store is None or sid not in store)
+    if not missing:
+        profiling.count(hits=len(speeches))
+        print(f"All {len(speeches)} speeches already embedded")
+        return store
+
+    model = _load_sentence_model(model_name)
+    dim = model.get_sentence_embedding_dimension()
+    max_tokens = model.max_seq_length - 2  # room for the special tokens
+    if store is not None and store.chunk_tokens != max_tokens:
+        print(f"Store was chunked at {store.chunk_tokens} tokens, re-embedding everything at {max_tokens}")
+        store = None
+        missing = sorted(speeches)
+    # speeches already in the store are cache hits
+    profiling.count(hits=len(speeches) - len(missing), misses=len(missing))
+
+    chunks, owners, num_tokens = [], [], []
+    for row, sid in enumerate(missing):
+        text = (speeches[sid].get("text") or "").strip()
+        if text == "":
+            continue
+        for chunk, n in chunk_text(text, model.tokenizer, max_tokens):
+            chunks.append(chunk)
+            owners.append(row)
+            num_tokens.append(n)
+    num_tokens = np.array(num_tokens, dtype=np.float32)
+
+    # length buckets: consecutive chunks of the sorted order form a batch
+    by_length = np.argsort(num_tokens, kind="stable")
+    batches = [by_length[i:i + batch_size] for i in range(0, len(by_length), batch_size)]
+    jobs = ((b, [chunks[j] for j in rows]) for b, rows in enumerate(batches))
+
+    chunk_embeddings = np.zeros((len(chunks), dim), dtype=np.float32)
+    print(f"Embedding {len(missing)} speeches ({len(chunks)} chunks) with {model_name}")
+    profiling.count(items=len(missing))
+    profiling.add(chunks=len(chunks), batches=len(batches))
+    for batch_id, embeddings in _encode_batches(jobs, model, model_name, num_workers):
+        chunk_embeddings[batches[batch_id]] = embeddings
+
+    pooled = np.zeros((len(missing), dim), dtype=np.float32)
+    np.add.at(pooled, np.array(owners, dtype=np.int64), chunk_embeddings * num_tokens[:, None])
+    norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    pooled = np.divide(pooled, norms, out=pooled, where=norms > 0)
+
+    if store is not None:
+        sids = store.sids + missing
+        matrix = np.concatenate([store.get(store.sids), pooled])
+    else:
+        sids, matrix = missing, pooled
+    order = np.argsort(sids, kind="stable")
+    sids = [sids[i] for i in order]
+    write_embedding_store(sids, matrix[order], store_dir, dtype=dtype, model_name=model_name, pooling=POOLING,
+                          chunk_tokens=max_tokens)
+    return load_embedding_store(store_dir)
+
+
+# ==========================================================
+# Static node features (topic names, ...) encoded once per model
+# ==========================================================
+
+class StaticFeatureTable:
+    """Sentence embeddings of fixed strings (e.g. topic names) for one model, looked up by name."""
+
+    def __init__(self, names, matrix, model_name):
+        self.names = list(names)
+        self.name2row = {name: i for i, name in enumerate(self.names)}
+        self.matrix = matrix
+        self.model_name = model_name
+
+    def __contains__(self, name):
+        return name in self.name2row
+
+    def get(self, names):
+        missing = [name for name in names if name not in self.name2row]
+        if missing:
+            raise KeyError(f"{missing} not encoded for {self.model_name}, run encode_static_features first")
+        return self.matrix[[self.name2row[name] for name in names]]
+
+
+def _static_feature_file(model_name, table_dir):
+    return Path(table_dir) / (model_name.replace("/", "__") + ".npz")
+
+
+def load_static_features(model_name=SENTENCE_MODEL, table_dir=STATIC_FEATURE_DIR):
+    path = _static_feature_file(model_name, table_dir)
+    if not path.exists():
+        return StaticFeatureTable([], np.zeros((0, 0), dtype=np.float32), model_name)
+    with np.load(path) as npz:
+        return StaticFeatureTable(npz["names"].tolist(), npz["matrix"], model_name)
+
+
+def encode_static_features(names, model_name=SENTENCE_MODEL, table_dir=STATIC_FEATURE_DIR):
+    """
+    Add any of `names` missing from the persisted table for `model_name`.
+    The SentenceTransformer is only loaded when there is something new to encode.
+    """
+    table = load_static_features(model_name, table_dir)
+    missing = sorted({name for name in names if name not in table})
+    if not missing:
+        return table
+
+    model = _load_sentence_model(model_name)
+    new_rows = np.asarray(model.encode(missing), dtype=np.float32)
+
+    all_names = table.names + missing
+    matrix = new_rows if len(table.names) == 0 else np.concatenate([table.matrix, new_rows])
+    return write_static_features(all_names, matrix, model_name, table_dir)
+
+
+def write_static_features(names, matrix, model_name=SENTENCE_MODEL, table_dir=STATIC_FEATURE_DIR):
+    """Persist the table for `model_name` (row i belongs to names[i]), replacing any previous one."""
+    path = _static_feature_file(model_name, table_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp.npz")
+    np.savez(tmp_path, names=np.array(names, dtype=str), matrix=matrix)
+    os.replace(tmp_path, path)
+    return StaticFeatureTable(list(names), matrix, model_name)
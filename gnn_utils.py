@@ -0,0 +1,394 @@
+import copy
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch_geometric.data import Batch, HeteroData
+from torch_geometric.nn import HGTConv
+from torch_geometric.loader import DataLoader
+
+import graph_dataset
+import temporal_graph
+from data_processing import profiling
+
+
+############################################################
+# 1. STATIC PER-SNAPSHOT FEATURES
+############################################################
+
+def speech_aggregates(data):
+    """
+    Returns [num_speech, 2]: [mean_topic_score, mean_lag] over each speech's mentions / references
+    edges. They only depend on the snapshot, so they are computed once, not every forward pass.
+    """
+    Ns = data["speech"].x.size(0)
+    device = data["speech"].x.device
+    extras = torch.zeros(Ns, 2, device=device)
+    count  = torch.zeros(Ns, 2, device=device)
+
+    # 1) Topic score
+    if ("speech","mentions","topic") in data.edge_types:
+        store = data["speech","mentions","topic"]
+        if store.get("edge_attr") is not None:
+            src = store.edge_index[0]
+            score = store.edge_attr.view(-1)
+            extras[:,0].index_add_(0, src, score)
+            count [:,0].index_add_(0, src, torch.ones_like(score))
+
+    # 2) lag
+    if ("day","references","speech") in data.edge_types:
+        store = data["day","references","speech"]
+        if store.get("edge_attr") is not None:
+            dst    = store.edge_index[1]
+            lagdec = store.edge_attr
+            extras[:,1:].index_add_(0, dst, lagdec)
+            count [:,1:].index_add_(0, dst, torch.ones_like(lagdec))
+
+    count = torch.clamp(count, min=1)
+    return extras / count
+
+
+def prepare_graph(data):
+    """
+    Make a snapshot batchable and attach its static features:
+      - speech.agg: speech_aggregates(data)
+      - author.x / topic.x: the node's position, the id the model embeds (author.x is a one-hot
+        eye(num_authors) and topic.x a text embedding; neither batches nor indexes an nn.Embedding)
+    """
+    data["speech"].agg = speech_aggregates(data)
+    data["author"].x = torch.arange(data["author"].num_nodes)
+    data["topic"].x = torch.arange(data["topic"].num_nodes)
+    return data
+
+
+############################################################
+# 2. MODEL
+############################################################
+
+class SpeechHeteroGNN(nn.Module):
+    """
+    ORIGINAL VERSION (before reduction):
+    - Speech node feature = 768 embedding + 3 raw features
+    - Edge aggregated features = 3 (mean_topic_score, mean_lag, mean_decay)
+    - Total = 774 dims → feed into speech_lin
+    """
+
+    def __init__(self, global_idx, hidden_dim=64, num_heads=2):
+        super().__init__()
+        self.hidden_dim = hidden_dim
+
+        # Number of items for embedding lookup
+        num_authors = len(global_idx["author2idx"]) + 1
+        num_topics  = len(global_idx["topic2idx"]) + 1
+        num_days    = len(global_idx["date2idx"]) + 1
+
+        # Embeddings for ID-based nodes
+        self.emb = nn.ModuleDict({
+            "author": nn.Embedding(num_authors, hidden_dim),
+            "topic":  nn.Embedding(num_topics, hidden_dim),
+            "day":    nn.Embedding(num_days, hidden_dim),
+        })
+
+        # ORIGINAL DIMENSION: 768 + 3 raw features + 3 aggregated = 774
+        self.speech_lin = nn.Linear(772, hidden_dim)
+
+        # HGTConv (original)
+        self.hgt = HGTConv(
+            in_channels=hidden_dim,
+            out_channels=hidden_dim,
+            metadata=(
+                ["author", "speech", "topic", "day"],
+                [
+                    ("author", "gives", "speech"),
+                    ("speech", "rev_gives", "author"),
+                    ("speech", "mentions", "topic"),
+                    ("topic", "rev_mentions", "speech"),
+                    ("day", "references", "speech"),
+                    ("speech", "rev_references", "day"),
+                    ("speech", "follows", "speech"),
+                    ("speech", "rev_follows", "speech"),
+                ]
+            ),
+            heads=num_heads,
+        )
+
+
+    ############################################################
+    # ORIGINAL 3-DIM AGG FEATURES
+    ############################################################
+    def compute_edge_features(self, data, device):
+        """
+        Returns [num_speech, 2]:
+          [mean_topic_score, mean_lag]
+        precomputed by prepare_graph when available
+        """
+        if "agg" in data["speech"]:
+            return data["speech"].agg.to(device)
+        return speech_aggregates(data).to(device)
+
+
+    ############################################################
+    # ORIGINAL FORWARD
+    ############################################################
+    def forward(self, data: HeteroData):
+        device = data["speech"].x.device
+        x_dict = {}
+
+        # Embedding lookup for author/topic/day
+        for ntype in ["author","topic","day"]:
+            idx = data[ntype].x.long().view(-1)
+            x_dict[ntype] = self.emb[ntype](idx)
+
+        if "h" in data["speech"]:
+            # speech_lin already applied (score_dates projects each speech once, not once per window)
+            x_dict["speech"] = data["speech"].h
+        else:
+            # Speech node features (NO REDUCTION)
+            base_feats = data["speech"].x.float()   # shape [N, 771]
+            edge_feats = self.compute_edge_features(data, device)
+
+            speech_full = torch.cat([base_feats, edge_feats], dim=-1)  # [N,774]
+            x_dict["speech"] = self.speech_lin(speech_full)
+
+        # HGT message passing
+        x_dict = self.hgt(x_dict, data.edge_index_dict)
+        return x_dict
+
+
+############################################################
+# 3. TOP MODEL: Predict from day-node
+############################################################
+
+class FedSpeechModel(nn.Module):
+    def __init__(self, global_idx, hidden_dim=64):
+        super().__init__()
+        self.gnn = SpeechHeteroGNN(global_idx, hidden_dim)
+        self.fc = nn.Linear(hidden_dim, 1)
+
+    def forward(self, g: HeteroData):
+        x = self.gnn(g)
+        day_emb = x["day"]          # [num_graphs, hidden_dim]: one day node per snapshot, in batch order
+        return self.fc(day_emb).view(-1)   # one prediction per snapshot
+
+
+
+############################################################
+# 4. TRAINING AND EVALUATION
+############################################################
+
+def _sync(device):
+    # CUDA kernels run asynchronously; only wait for them when batch timings are recorded
+    if str(device).startswith("cuda"):
+        torch.cuda.synchronize()
+    return time.perf_counter()
+
+
+@profiling.profiled("train_epoch")
+def train_epoch(model, loader, optimizer, device):
+    model.train()
+    # summed on device, read back once per epoch instead of syncing on every step
+    total_loss = torch.zeros((), device=device)
+    n = 0
+    timed = profiling.enabled()
+    t_prev = time.perf_counter()
+
+    for g in loader:
+        if timed:
+            t0 = _sync(device)
+        g = g.to(device)
+        target = g.y.to(device).float().view(-1)
+
+        pred = model(g)
+        loss = F.mse_loss(pred, target)
+        if timed:
+            t1 = _sync(device)
+
+        optimizer.zero_grad()
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+        optimizer.step()
+
+        total_loss += loss.detach() * target.numel()
+        n += target.numel()
+        if timed:
+            t2 = _sync(device)
+            # load_s: waiting for the loader (collating, or sampling a TemporalGraphDataset)
+            profiling.event("train_batch", graphs=target.numel(), speech_nodes=g["speech"].num_nodes,
+                            load_s=t0 - t_prev, forward_s=t1 - t0, backward_s=t2 - t1)
+            profiling.count(items=target.numel())
+            t_prev = t2
+
+    return total_loss.item() / n
+
+
+@torch.no_grad()
+@profiling.profiled("eval_epoch")
+def eval_epoch(model, loader, device):
+    model.eval()
+    total_loss = torch.zeros((), device=device)
+    n = 0
+
+    for g in loader:
+        g = g.to(device)
+        target = g.y.to(device).float().view(-1)
+
+        pred = model(g)
+        loss = F.mse_loss(pred, target, reduction="sum")
+
+        total_loss += loss
+        n += target.numel()
+
+    profiling.count(items=n)
+    return total_loss.item() / n
+
+
+
+############################################################
+# 5. TRAIN MODEL
+############################################################
+
+def train_model(graphs, global_idx, hidden_dim=64, epochs=50, batch_size=1):
+    """
+    batch_size snapshots go through the model per optimizer step (batch_size=1 is the original
+    one-graph-per-step loop). Snapshots are materialized and prepared (prepare_graph) once, up front
+    (a graph_dataset.LookbackView is cut down to its lookback then), except for a
+    temporal_graph.TemporalGraphDataset, whose subgraphs are sampled (and prepared) as each batch is
+    loaded, so memory does not grow with the number of dates or the lookback.
+    """
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    # Remove graphs without speech nodes
+    if isinstance(graphs, temporal_graph.TemporalGraphDataset):
+        graphs = graphs.index_select(graphs.nonempty_indices())
+        graphs.transform = prepare_graph
+    elif isinstance(graphs, (graph_dataset.PackedGraphDataset, graph_dataset.LookbackView)):
+        graphs = [prepare_graph(graphs.get(i)) for i in graphs.nonempty_indices()]
+    else:
+        graphs = [prepare_graph(g) for g in graphs if g["speech"].x.size(0) > 0]
+
+    # Chronological split
+    n = len(graphs)
+    n_train = int(n * 0.9)
+    train_graphs = graphs[:n_train]
+    val_graphs   = graphs[n_train:]
+
+    train_loader = DataLoader(train_graphs, batch_size=batch_size, shuffle=False)
+    val_loader   = DataLoader(val_graphs, batch_size=batch_size, shuffle=False)
+
+    model = FedSpeechModel(global_idx, hidden_dim).to(device)
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-4, weight_decay=1e-3)
+
+    print(f"Training on device: {device}")
+    print(f"Graphs: {n}, Train: {len(train_graphs)}, Val: {len(val_graphs)}")
+
+    best_val = float("inf")
+    best_train = float("inf")
+    best_state = None
+    patience = 50
+    bad_epochs = 0
+
+    train_loss_curve = {}
+    dev_loss_curve = {}
+
+    for epoch in range(1, epochs+1):
+        start = time.perf_counter()
+        train_loss = train_epoch(model, train_loader, optimizer, device)
+        val_loss   = eval_epoch(model, val_loader, device)
+        elapsed = time.perf_counter() - start
+
+        train_loss_curve[epoch] = train_loss
+        dev_loss_curve[epoch] = val_loss
+
+        print(f"Epoch {epoch:03d} | Train={train_loss:.4f} | Val={val_loss:.4f} | {elapsed:.1f}s")
+
+        if val_loss < best_val - 1e-6:
+            best_val = val_loss
+            best_train = train_loss
+            best_state = copy.deepcopy(model.state_dict())
+            bad_epochs = 0
+        else:
+            bad_epochs += 1
+
+        if bad_epochs >= patience:
+            print("Early stopping.")
+            break
+
+    model.load_state_dict(best_state)
+    print("Best Val MSE:", best_val, "Best Train MSE:", best_train)
+    return model, train_loss_curve, dev_loss_curve
+
+
+def save_model(model, path):
+    """Weights plus the hidden size, everything load_model needs besides global_idx."""
+    torch.save({"hidden_dim": model.gnn.hidden_dim, "state_dict": model.state_dict()}, path)
+
+
+def load_model(path, global_idx, device="cpu"):
+    """A FedSpeechModel written by save_model, in eval mode. global_idx must be the training one."""
+    checkpoint = torch.load(path, map_location=device)
+    model = FedSpeechModel(global_idx, checkpoint["hidden_dim"])
+    model.load_state_dict(checkpoint["state_dict"])
+    return model.to(device).eval()
+
+
+
+############################################################
+# 6. INFERENCE OVER A DATE RANGE
+############################################################
+
+# speech_lin input columns that depend on the target day: rate change if known, mean topic score
+# and mean lag (speech.agg); the others (embedding, speech date index) only depend on the speech
+NUM_DAY_DEPENDENT = 3
+
+
+def speech_projection_table(model, graph, chunk_size=4096):
+    """
+    The day-independent part of speech_lin (embedding and speech date index, plus the bias) for every
+    speech of a temporal_graph.TemporalSpeechGraph, [num_speeches, hidden_dim] in its row order.
+    """
+    lin = model.gnn.speech_lin
+    static_weight = lin.weight[:, :-NUM_DAY_DEPENDENT]
+    parts = []
+    for start in range(0, len(graph), chunk_size):
+        rows = np.arange(start, min(start + chunk_size, len(graph)))
+        emb = np.asarray(graph.emb_matrix[graph.emb_row[rows]], dtype=np.float32).reshape(len(rows), -1)
+        x = torch.from_numpy(np.concatenate([emb, graph.sdate_idx[rows, None]], axis=1))
+        parts.append(x.to(lin.weight.device) @ static_weight.T + lin.bias)
+    return torch.cat(parts) if parts else lin.weight.new_zeros((0, lin.out_features))
+
+
+@torch.inference_mode()
+def score_dates(model, graph, dates=None, lookback_days=temporal_graph.LOOKBACK_DAYS, max_speeches=None,
+                follow_top_k=None, follow_max_lag=None, batch_size=64, compile=False, device="cpu"):
+    """
+    Predictions of model for every date of a temporal_graph.TemporalSpeechGraph (default: all its rates
+    dates) as a Series, NaN for windows without speeches. Each speech's embedding goes through
+    speech_lin once (speech_projection_table) instead of once per window it falls in; windows are
+    sampled without their embeddings and batch_size of them are scored per forward pass.
+    compile=True runs the model through torch.compile; compiling takes longer than one pass over the
+    ~650 real dates, so it only pays off for repeated or much longer backfills.
+    """
+    model = model.to(device).eval()
+    table = speech_projection_table(model, graph)
+    day_weight = model.gnn.speech_lin.weight[:, -NUM_DAY_DEPENDENT:]
+    forward = torch.compile(model, dynamic=True) if compile else model
+
+    dates = list(graph.rate_dates if dates is None else pd.DatetimeIndex(dates))
+    counts = graph.num_speeches(dates, lookback_days, max_speeches)
+    scored = [d for d, c in zip(dates, counts) if c > 0]
+
+    predictions = {}
+    for start in range(0, len(scored), batch_size):
+        chunk = scored[start:start + batch_size]
+        batch = Batch.from_data_list([
+            prepare_graph(graph.sample(d, lookback_days, max_speeches, follow_top_k, follow_max_lag,
+                                       speech_features=False))
+            for d in chunk
+        ]).to(device)
+        speech = batch["speech"]
+        speech.h = table[speech.row] + torch.cat([speech.x, speech.agg], dim=-1) @ day_weight.T
+        predictions.update(zip(chunk, forward(batch).tolist()))
+    return pd.Series([predictions.get(d, np.nan) for d in dates], index=pd.DatetimeIndex(dates), name="prediction")
@@ -0,0 +1,336 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import torch
+from torch_geometric.data import Dataset, HeteroData
+
+
+# One packed file replaces graph_XXXX.pt: an 8-byte header length, a JSON header, then raw arrays
+# (64-byte aligned) that are opened with np.memmap. Speech embeddings and topic features are stored
+# once in global tables and every snapshot refers to them by row, so nothing is duplicated per window.
+PACK_VERSION = 1
+_ALIGN = 64
+
+EDGE_TYPES = [
+    ("author", "gives", "speech"),
+    ("speech", "mentions", "topic"),
+    ("day", "references", "speech"),
+    ("speech", "follows", "speech"),
+    ("speech", "rev_follows", "speech"),
+    ("speech", "rev_gives", "author"),
+    ("topic", "rev_mentions", "speech"),
+    ("speech", "rev_references", "day"),
+]
+
+
+def _edge_key(edge_type):
+    return "__".join(edge_type)
+
+
+def _write_arrays(path, arrays, meta):
+    header = {"meta": meta, "arrays": {}}
+    offset = 0
+    for name, arr in arrays.items():
+        offset = -(-offset // _ALIGN) * _ALIGN
+        header["arrays"][name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += arr.nbytes
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = -(-(8 + len(header_bytes)) // _ALIGN) * _ALIGN
+
+    path = Path(path)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        for name, arr in arrays.items():
+            f.seek(data_start + header["arrays"][name]["offset"])
+            f.write(np.ascontiguousarray(arr).tobytes())
+    tmp_path.replace(path)
+
+
+def _open_arrays(path):
+    with open(path, "rb") as f:
+        header_len = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    data_start = -(-(8 + header_len) // _ALIGN) * _ALIGN
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        shape = tuple(spec["shape"])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.zeros(shape, dtype=spec["dtype"])
+        else:
+            arrays[name] = np.memmap(path, dtype=spec["dtype"], mode="r",
+                                     offset=data_start + spec["offset"], shape=shape)
+    return header["meta"], arrays
+
+
+class _RowTable:
+    """Deduplicates feature rows: identical rows get the same index."""
+
+    def __init__(self):
+        self.row_of = {}
+        self.rows = []
+
+    def add(self, x):
+        idx = np.empty(len(x), dtype=np.int64)
+        for i, row in enumerate(x):
+            key = row.tobytes()
+            if key not in self.row_of:
+                self.row_of[key] = len(self.rows)
+                self.rows.append(row)
+            idx[i] = self.row_of[key]
+        return idx
+
+    def matrix(self, dim):
+        if not self.rows:
+            return np.zeros((0, dim), dtype=np.float32)
+        return np.stack(self.rows).astype(np.float32)
+
+
+def pack_graphs(graphs, path, speech_emb_dim=768):
+    """
+    Pack an iterable of HeteroData snapshots (as written by graph_utils) into one file.
+    Snapshots are consumed one at a time, so a generator over graph files keeps memory flat.
+    """
+    speech_table, topic_table = _RowTable(), _RowTable()
+    topic_dim = 0
+
+    counts = {"author": [], "speech": [], "topic": []}
+    speech_row, speech_extra, speech_date, topic_row = [], [], [], []
+    day_x, ys, dates = [], [], []
+    edge_index = {et: [] for et in EDGE_TYPES}
+    edge_attr = {et: [] for et in EDGE_TYPES}
+    edge_count = {et: [] for et in EDGE_TYPES}
+
+    for g in graphs:
+        sx = g["speech"].x.numpy()
+        tx = g["topic"].x.numpy()
+        counts["author"].append(g["author"].x.size(0))
+        counts["speech"].append(sx.shape[0])
+        counts["topic"].append(tx.shape[0])
+
+        speech_row.append(speech_table.add(sx[:, :speech_emb_dim]))
+        speech_extra.append(sx[:, speech_emb_dim:].reshape(sx.shape[0], -1))
+        speech_date.append(np.array([d.split(" ")[0] for d in g["speech"].date], dtype="datetime64[D]"))
+        if tx.shape[0]:
+            topic_dim = tx.shape[1]
+            topic_row.append(topic_table.add(tx))
+
+        day_x.append(g["day"].x.numpy().reshape(-1))
+        ys.append(float(g.y.view(-1)[0]))
+        dates.append(int(g.date.view(-1)[0]))
+
+        for et in EDGE_TYPES:
+            store = g[et]
+            ei = store.edge_index.numpy()
+            edge_index[et].append(ei)
+            edge_count[et].append(ei.shape[1])
+            attr = store.get("edge_attr")
+            if attr is not None and attr.numel():
+                edge_attr[et].append(attr.numpy().reshape(ei.shape[1], -1))
+
+    extra_dim = speech_extra[0].shape[1] if speech_extra else 0
+    arrays = {
+        "num_author": np.array(counts["author"], dtype=np.int64),
+        "num_speech": np.array(counts["speech"], dtype=np.int64),
+        "num_topic": np.array(counts["topic"], dtype=np.int64),
+        "speech_table": speech_table.matrix(speech_emb_dim),
+        "topic_table": topic_table.matrix(topic_dim),
+        "speech_row": np.concatenate(speech_row) if speech_row else np.zeros(0, dtype=np.int64),
+        "speech_extra": np.concatenate(speech_extra).astype(np.float32) if speech_extra
+        else np.zeros((0, extra_dim), dtype=np.float32),
+        "speech_date": np.concatenate(speech_date) if speech_date else np.zeros(0, dtype="datetime64[D]"),
+        "topic_row": np.concatenate(topic_row) if topic_row else np.zeros(0, dtype=np.int64),
+        "day_x": np.array(day_x, dtype=np.float32).reshape(-1, 1),
+        "y": np.array(ys, dtype=np.float32),
+        "date": np.array(dates, dtype=np.int64),
+    }
+    edge_attr_dims = {}
+    for et in EDGE_TYPES:
+        key = _edge_key(et)
+        arrays[f"{key}.count"] = np.array(edge_count[et], dtype=np.int64)
+        arrays[f"{key}.index"] = np.concatenate(edge_index[et], axis=1).astype(np.int64) if edge_index[et] \
+            else np.zeros((2, 0), dtype=np.int64)
+        if edge_attr[et]:
+            arrays[f"{key}.attr"] = np.concatenate(edge_attr[et]).astype(np.float32)
+            edge_attr_dims[key] = arrays[f"{key}.attr"].shape[1]
+
+    meta = {"version": PACK_VERSION, "speech_emb_dim": speech_emb_dim, "edge_attr_dims": edge_attr_dims}
+    _write_arrays(path, arrays, meta)
+    return path
+
+
+def pack_graph_dir(graph_dir, path=None, speech_emb_dim=768):
+    """
+    Convert a directory of graph_XXXX.pt snapshots into one packed file (default: <graph_dir>.pack).
+    Packs are generated files and are not versioned: rerun this after the snapshots change.
+    """
+    graph_dir = Path(graph_dir)
+    path = Path(path) if path is not None else graph_dir.with_suffix(".pack")
+    files = sorted(graph_dir.glob("graph_*.pt"))
+    graphs = (torch.load(f, weights_only=False) for f in files)
+    return pack_graphs(graphs, path, speech_emb_dim=speech_emb_dim)
+
+
+def _offsets(counts):
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    return offsets
+
+
+def _tensor(arr, dtype=None):
+    # slices of a read-only memmap: copy so torch gets a writable, owned buffer
+    return torch.from_numpy(np.array(arr, dtype=dtype))
+
+
+class PackedGraphDataset(Dataset):
+    """
+    Lazy, PyG-compatible view over a packed graph file. get(i) materializes snapshot i as the same
+    HeteroData graph_utils.build_graph_for_date produced; only that snapshot's rows are read.
+    """
+
+    def __init__(self, path, transform=None):
+        self.path = Path(path)
+        self.meta, self.arrays = _open_arrays(self.path)
+        if self.meta["version"] != PACK_VERSION:
+            raise ValueError(f"{self.path} has pack version {self.meta['version']}, expected {PACK_VERSION}")
+
+        a = self.arrays
+        self.node_offsets = {ntype: _offsets(a[f"num_{ntype}"]) for ntype in ["author", "speech", "topic"]}
+        self.edge_offsets = {et: _offsets(a[f"{_edge_key(et)}.count"]) for et in EDGE_TYPES}
+        super().__init__(None, transform)
+
+    @property
+    def speech_table(self):
+        return self.arrays["speech_table"]
+
+    @property
+    def topic_table(self):
+        return self.arrays["topic_table"]
+
+    def len(self):
+        return len(self.arrays["y"])
+
+    def nonempty_indices(self):
+        """Snapshots with at least one speech node (train_model drops the others)."""
+        return np.flatnonzero(self.arrays["num_speech"] > 0).tolist()
+
+    def get(self, idx):
+        a = self.arrays
+        data = HeteroData()
+
+        s0, s1 = self.node_offsets["speech"][idx:idx + 2]
+        rows = np.asarray(a["speech_row"][s0:s1])
+        speech_x = np.concatenate([a["speech_table"][rows], a["speech_extra"][s0:s1]], axis=1)
+        data["speech"].x = _tensor(speech_x, np.float32)
+        speech_dates = np.datetime_as_string(np.asarray(a["speech_date"][s0:s1]).astype("datetime64[s]"))
+        data["speech"].date = [d.replace("T", " ") for d in speech_dates]
+
+        num_authors = int(a["num_author"][idx])
+        data["author"].x = torch.eye(num_authors, dtype=torch.float32)
+
+        t0, t1 = self.node_offsets["topic"][idx:idx + 2]
+        data["topic"].x = _tensor(a["topic_table"][np.asarray(a["topic_row"][t0:t1])], np.float32)
+
+        data["day"].x = _tensor(a["day_x"][idx:idx + 1], np.float32)
+
+        for et in EDGE_TYPES:
+            key = _edge_key(et)
+            e0, e1 = self.edge_offsets[et][idx:idx + 2]
+            data[et].edge_index = _tensor(a[f"{key}.index"][:, e0:e1], np.int64)
+            if key in self.meta["edge_attr_dims"]:
+                data[et].edge_attr = _tensor(a[f"{key}.attr"][e0:e1], np.float32)
+
+        data.y = _tensor(a["y"][idx:idx + 1], np.float32)
+        data.date = _tensor(a["date"][idx:idx + 1], np.int64)
+        return data
+
+
+def load_packed_graphs(path):
+    return PackedGraphDataset(path)
+
+
+############################################################
+# Smaller lookbacks derived from one max-lookback build
+############################################################
+
+def _keep_edges(store, keep_src, keep_dst, src_map, dst_map):
+    ei = store.edge_index
+    mask = keep_src[ei[0]] & keep_dst[ei[1]]
+    store.edge_index = torch.stack([src_map[ei[0, mask]], dst_map[ei[1, mask]]])
+    if store.get("edge_attr") is not None:
+        store.edge_attr = store.edge_attr[mask]
+
+
+def restrict_lookback(data, lookback_days):
+    """
+    The snapshot graph_utils.build_graph_for_date would build with a shorter lookback_days, cut out
+    of one built with a longer one: speeches whose day -> speech lag is under lookback_days are kept,
+    with their authors, topics and edges, in the same order. "follows" edges come out the same as a
+    direct build as long as the longer build used the default follow_max_lag (its own lookback) or
+    the same explicit one. Returns a new HeteroData; data is not modified.
+    """
+    data = data.clone()
+    refs = data["day", "references", "speech"]
+    num_speech = data["speech"].num_nodes
+    lag = torch.full((num_speech,), float("inf"))
+    lag[refs.edge_index[1]] = refs.edge_attr.view(-1)
+    keep = {"speech": lag < lookback_days}
+
+    # authors and topics that still have a speech
+    gives = data["author", "gives", "speech"].edge_index
+    keep["author"] = torch.zeros(data["author"].num_nodes, dtype=torch.bool)
+    keep["author"][gives[0, keep["speech"][gives[1]]]] = True
+    mentions = data["speech", "mentions", "topic"].edge_index
+    keep["topic"] = torch.zeros(data["topic"].num_nodes, dtype=torch.bool)
+    keep["topic"][mentions[1, keep["speech"][mentions[0]]]] = True
+    keep["day"] = torch.ones(data["day"].num_nodes, dtype=torch.bool)
+
+    new_index = {ntype: torch.cumsum(mask.long(), 0) - 1 for ntype, mask in keep.items()}
+    for src, rel, dst in data.edge_types:
+        _keep_edges(data[src, rel, dst], keep[src], keep[dst], new_index[src], new_index[dst])
+
+    speech = data["speech"]
+    speech.x = speech.x[keep["speech"]]
+    speech.date = [d for d, k in zip(speech.date, keep["speech"].tolist()) if k]
+    if "agg" in speech:
+        speech.agg = speech.agg[keep["speech"]]
+    data["author"].x = torch.eye(int(keep["author"].sum()), dtype=torch.float32)
+    data["topic"].x = data["topic"].x[keep["topic"]]
+    return data
+
+
+class LookbackView(Dataset):
+    """
+    A dataset of snapshots built with a long lookback (a PackedGraphDataset or a list), seen with a
+    shorter one: get(i) is restrict_lookback(graphs[i], lookback_days). One max-lookback build then
+    serves every lookback of a sweep, without rebuilding or repacking.
+    """
+
+    def __init__(self, graphs, lookback_days, transform=None):
+        self.graphs = graphs
+        self.lookback_days = lookback_days
+        super().__init__(None, transform)
+
+    def len(self):
+        return len(self.graphs)
+
+    def _lags(self):
+        """Per snapshot, the day -> speech lags, read from the packed arrays when there are some."""
+        if isinstance(self.graphs, PackedGraphDataset):
+            et = ("day", "references", "speech")
+            attr = np.asarray(self.graphs.arrays[f"{_edge_key(et)}.attr"]).reshape(-1)
+            offsets = self.graphs.edge_offsets[et]
+            return [attr[offsets[i]:offsets[i + 1]] for i in range(len(self.graphs))]
+        return [g["day", "references", "speech"].edge_attr.view(-1).numpy() for g in self.graphs]
+
+    def nonempty_indices(self):
+        """Snapshots with at least one speech inside the shorter window."""
+        return [i for i, lag in enumerate(self._lags()) if (lag < self.lookback_days).any()]
+
+    def get(self, idx):
+        g = self.graphs.get(idx) if isinstance(self.graphs, Dataset) else self.graphs[idx]
+        return restrict_lookback(g, self.lookback_days)
@@ -0,0 +1,478 @@
+import hashlib
+import json
+import multiprocessing as mp
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import torch
+from torch_geometric.data import HeteroData
+
+import analysis_utils
+import embedding_utils
+from data_processing import profiling
+
+LOOKBACK_DAYS = analysis_utils.LOOKBACK_DAYS
+TARGET_COLUMN = "Rate_Change"
+FORWARD_DAYS = analysis_utils.FORWARD_DAYS
+
+MANIFEST_FILE = "manifest.json"
+# Bump whenever build_graph_for_date changes what it writes, so every snapshot is rebuilt
+BUILDER_VERSION = 1
+
+
+def get_speeches_in_window(target_date, lookback_days, speech_index):
+    """
+    Returns a list of speech IDs whose date is in [target_date - lookback_days + 1, target_date].
+    speech_index is an analysis_utils.SpeechTimeIndex.
+    """
+    return speech_index.window(target_date, lookback_days)
+
+
+def _graph_file(out_dir, i):
+    return Path(out_dir) / f"graph_{i:04d}.pt"
+
+
+def build_all_graphs(
+    speeches,
+    embedding_store,
+    topic_scores,
+    rates_df,
+    out_dir="graphs",
+    lookback_days=LOOKBACK_DAYS,
+    target_column=TARGET_COLUMN,
+    topic_table=None,
+    follow_top_k=None,
+    follow_max_lag=None,
+    num_workers=1
+):
+    """Build every snapshot from scratch: update_graphs with force=True. Returns the built dates."""
+    return update_graphs(
+        speeches,
+        embedding_store,
+        topic_scores,
+        rates_df,
+        out_dir=out_dir,
+        lookback_days=lookback_days,
+        target_column=target_column,
+        topic_table=topic_table,
+        follow_top_k=follow_top_k,
+        follow_max_lag=follow_max_lag,
+        num_workers=num_workers,
+        force=True,
+    )
+
+
+# ==========================================================
+# Incremental builds
+# ==========================================================
+
+def _digest(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _rate_change_for_speech(sdate, d, rates_df):
+    """Same rule as build_graph_for_date: the post-speech rate change is only known once sdate + FORWARD_DAYS <= d."""
+    all_dates = rates_df.index
+    idx = all_dates.get_loc(sdate)
+    if idx + 1 < len(all_dates):
+        if all_dates[idx] + pd.Timedelta(days=FORWARD_DAYS) <= d:
+            return float(rates_df[TARGET_COLUMN].loc[sdate])
+    return 0.0
+
+
+def snapshot_input_hashes(
+    speeches,
+    embedding_store,
+    topic_scores,
+    rates_df,
+    speech_index,
+    global_idx,
+    lookback_days=LOOKBACK_DAYS,
+    target_column=TARGET_COLUMN,
+    topic_table=None,
+    follow_top_k=None,
+    follow_max_lag=None
+):
+    """
+    One content hash per date in global_idx["dates"], covering every input build_graph_for_date reads
+    for that snapshot: the window's speeches (author, date, embedding, topic scores), the rates it uses,
+    the global date indices, the topic node features and the build parameters.
+    """
+    date2idx = global_idx["date2idx"]
+    if topic_table is None:
+        topic_table = embedding_utils.load_static_features()
+
+    topic_names = sorted(global_idx["topic2idx"])
+    topic_digest = hashlib.sha1(np.ascontiguousarray(topic_table.get(topic_names)).tobytes()).hexdigest()
+
+    speech_digest = {}
+    for sid, info in speeches.items():
+        emb = embedding_store.get([sid]) if sid in embedding_store else None
+        speech_digest[sid] = _digest([
+            info["author"],
+            str(info["date"]),
+            date2idx.get(info["date"], -1),
+            hashlib.sha1(emb.tobytes()).hexdigest() if emb is not None else None,
+            topic_scores.get(sid),
+        ])
+
+    dates = sorted(global_idx["dates"])
+    windows = speech_index.windows(dates, lookback_days)
+
+    # the follows caps only enter the hash when set, so snapshots built without them stay valid
+    follow_caps = [] if follow_top_k is None and follow_max_lag is None else [follow_top_k, follow_max_lag]
+
+    hashes = []
+    for d, window in zip(dates, windows):
+        local_speech_ids = sorted(set(window))
+        hashes.append(_digest(follow_caps + [
+            BUILDER_VERSION,
+            str(d),
+            date2idx[d],
+            lookback_days,
+            target_column,
+            topic_table.model_name,
+            topic_digest,
+            float(rates_df.loc[d, target_column]),
+            [[sid, speech_digest[sid], _rate_change_for_speech(speeches[sid]["date"], d, rates_df)]
+             for sid in local_speech_ids],
+        ]))
+    return hashes
+
+
+def _load_manifest(out_dir):
+    path = Path(out_dir) / MANIFEST_FILE
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(out_dir, manifest):
+    path = Path(out_dir) / MANIFEST_FILE
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+# ==========================================================
+# Parallel builds: workers share the read-only inputs and stream snapshots to disk
+# ==========================================================
+
+_WORKER_STATE = {}
+
+
+def _init_worker(state):
+    # fork: state is inherited, nothing is copied; spawn: it is pickled once per worker
+    # (the embedding store re-opens its memory map instead of being pickled)
+    _WORKER_STATE.update(state)
+    torch.set_num_threads(1)
+
+
+def _build_and_save(job):
+    i, d = job
+    state = _WORKER_STATE
+    g = build_graph_for_date(
+        d,
+        state["speeches"],
+        state["embedding_store"],
+        state["topic_scores"],
+        state["rates_df"],
+        state["speech_index"],
+        state["global_idx"],
+        lookback_days=state["lookback_days"],
+        target_column=state["target_column"],
+        topic_table=state["topic_table"],
+        follow_top_k=state["follow_top_k"],
+        follow_max_lag=state["follow_max_lag"],
+    )
+    path = _graph_file(state["out_dir"], i)
+    tmp_path = path.with_suffix(".pt.tmp")
+    torch.save(g, tmp_path)
+    os.replace(tmp_path, path)
+    return i, d
+
+
+def _run_jobs(jobs, state, num_workers):
+    """Yields (i, d) for each finished snapshot; only one snapshot per worker is ever held in memory."""
+    if num_workers <= 1 or len(jobs) <= 1:
+        _WORKER_STATE.update(state)
+        for job in jobs:
+            yield _build_and_save(job)
+        return
+
+    start_method = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+    ctx = mp.get_context(start_method)
+    chunksize = max(1, len(jobs) // (num_workers * 8))
+    with ctx.Pool(num_workers, initializer=_init_worker, initargs=(state,)) as pool:
+        yield from pool.imap_unordered(_build_and_save, jobs, chunksize=chunksize)
+
+
+@profiling.profiled("update_graphs")
+def update_graphs(
+    speeches,
+    embedding_store,
+    topic_scores,
+    rates_df,
+    out_dir="graphs",
+    lookback_days=LOOKBACK_DAYS,
+    target_column=TARGET_COLUMN,
+    topic_table=None,
+    follow_top_k=None,
+    follow_max_lag=None,
+    num_workers=1,
+    force=False
+):
+    """
+    Rebuild only the snapshots whose input hash changed since the last build (new speeches,
+    rate prints or topic scores inside their window) and drop snapshots for dates that no longer exist.
+    force=True rebuilds everything. With num_workers > 1 target dates are sharded across a process pool.
+    Returns the list of rebuilt dates.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    global_idx = analysis_utils.build_global_indices(speeches, topic_scores, rates_df)
+    if topic_table is None:
+        topic_table = embedding_utils.load_static_features()
+    speech_index = analysis_utils.build_speech_time_index(speeches)
+    dates = sorted(global_idx["dates"])
+
+    hashes = snapshot_input_hashes(speeches, embedding_store, topic_scores, rates_df, speech_index,
+                                   global_idx, lookback_days, target_column, topic_table,
+                                   follow_top_k, follow_max_lag)
+
+    old_manifest = _load_manifest(out_dir)
+    manifest = {}
+    jobs = []
+
+    for i, (d, h) in enumerate(zip(dates, hashes)):
+        path = _graph_file(out_dir, i)
+        entry = {"date": str(d), "hash": h}
+        if not force and old_manifest.get(path.name) == entry and path.exists():
+            manifest[path.name] = entry
+            continue
+        jobs.append((i, d))
+    # unchanged snapshots are cache hits, rebuilt ones misses
+    profiling.count(hits=len(manifest), misses=len(jobs))
+
+    state = {
+        "speeches": speeches,
+        "embedding_store": embedding_store,
+        "topic_scores": topic_scores,
+        "rates_df": rates_df,
+        "speech_index": speech_index,
+        "global_idx": global_idx,
+        "lookback_days": lookback_days,
+        "target_column": target_column,
+        "topic_table": topic_table,
+        "follow_top_k": follow_top_k,
+        "follow_max_lag": follow_max_lag,
+        "out_dir": out_dir,
+    }
+    rebuilt = []
+    try:
+        for i, d in _run_jobs(jobs, state, num_workers):
+            manifest[_graph_file(out_dir, i).name] = {"date": str(d), "hash": hashes[i]}
+            rebuilt.append(d)
+            profiling.count(items=1)
+    finally:
+        # Record whatever finished, so an interrupted build resumes instead of starting over
+        _save_manifest(out_dir, manifest if len(rebuilt) == len(jobs) else {**old_manifest, **manifest})
+        _WORKER_STATE.clear()
+
+    # Snapshots past the last date (e.g. a removed speech day) would otherwise be picked up by load_graphs
+    for stale in out_dir.glob("graph_*.pt"):
+        if stale.name not in manifest:
+            stale.unlink()
+
+    rebuilt.sort()
+    print(f"Rebuilt {len(rebuilt)} of {len(dates)} graphs in {out_dir}")
+    return rebuilt
+
+
+def follow_edges(speech_dates, max_lag, top_k=None):
+    """
+    "follows" edges among the speeches dated speech_dates (datetime64[D], in node order): every speech
+    points to each earlier speech at most max_lag days before it, or only to its top_k most recent
+    ones when top_k is set. Built from the date-sorted order with two binary searches per speech, so
+    the cost is linear in the number of edges. Returns (src, dst, lag) ordered by src, then dst.
+    """
+    days = np.asarray(speech_dates, dtype="datetime64[D]").astype(np.int64)
+    order = np.argsort(days, kind="stable")
+    sorted_days = days[order]
+
+    # earlier speeches of node i are sorted positions [lo[i], hi[i]): before its own day, within max_lag
+    hi = np.searchsorted(sorted_days, days, side="left")
+    lo = np.searchsorted(sorted_days, days - max_lag, side="left")
+    if top_k is not None:
+        lo = np.maximum(lo, hi - top_k)
+    counts = hi - lo
+
+    src = np.repeat(np.arange(len(days)), counts)
+    dst = order[np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())]
+    keep = np.lexsort((dst, src))
+    src, dst = src[keep], dst[keep]
+    return src, dst, days[src] - days[dst]
+
+
+def _edge_tensor(src, dst):
+    return torch.from_numpy(np.stack([src, dst]).astype(np.int64).reshape(2, -1))
+
+
+def _attr_tensor(values):
+    return torch.from_numpy(np.asarray(values, dtype=np.float32).reshape(-1, 1))
+
+
+@profiling.profiled("build_graph_for_date")
+def build_graph_for_date(
+    d,
+    speeches,
+    embedding_store,
+    topic_scores,
+    rates_df,
+    speech_index,
+    global_idx,
+    lookback_days=30,
+    target_column="ffr_delta",
+    topic_table=None,
+    follow_top_k=None,
+    follow_max_lag=None
+):
+    """
+    Build a HeteroData graph snapshot for date d.
+    Each speech node stores:
+        - embedding
+        - speech date index
+        - lag from d
+        - rate change after speech (only if known)
+        - raw date (string) for visualization
+
+    New edges:
+        speech -> speech ("follows") for past speeches within follow_max_lag days (default
+        lookback_days), only the follow_top_k most recent ones per speech when set
+    """
+
+    date2idx = global_idx["date2idx"]
+    d = pd.Timestamp(d)
+    day = np.datetime64(d, "D")
+
+    # ==========================================================
+    # 1. Collect speech IDs in window
+    # ==========================================================
+    local_speech_ids = sorted(set(get_speeches_in_window(d, lookback_days, speech_index)))
+    num_speeches = len(local_speech_ids)
+    speech_idx = np.arange(num_speeches)
+
+    sdates = [speeches[sid]["date"] for sid in local_speech_ids]
+    speech_days = np.array(sdates, dtype="datetime64[D]").reshape(-1)
+
+    # ==========================================================
+    # 2. AUTHOR NODES
+    # ==========================================================
+    speech_authors = [speeches[sid]["author"] for sid in local_speech_ids]
+    author_names = sorted(set(speech_authors))
+    author_name2i = {name: i for i, name in enumerate(author_names)}
+
+    data = HeteroData()
+    num_authors = len(author_names)
+    data["author"].x = torch.eye(num_authors, dtype=torch.float32)
+
+    # ==========================================================
+    # 3. SPEECH NODES with metadata
+    # ==========================================================
+    all_dates = rates_df.index
+
+    # embeddings gathered from the memory-mapped store in one call
+    speech_embs = embedding_store.get(local_speech_ids)
+    sdate_idx = np.array([date2idx.get(sdate, -1) for sdate in sdates], dtype=np.float32)
+
+    # rate change after speech, only if it is known on d (sdate + FORWARD_DAYS <= d)
+    loc = all_dates.get_indexer(pd.DatetimeIndex(sdates))
+    if (loc < 0).any():
+        raise KeyError(sdates[int(np.argmax(loc < 0))])
+    known = (loc + 1 < len(all_dates)) & (all_dates[loc] + pd.Timedelta(days=FORWARD_DAYS) <= d)
+    rate_change = np.where(known, rates_df[TARGET_COLUMN].to_numpy()[loc], 0.0)
+
+    speech_feats = np.concatenate([
+        speech_embs,
+        sdate_idx[:, None],
+        rate_change[:, None].astype(np.float32),
+    ], axis=1)
+
+    data["speech"].x = torch.from_numpy(speech_feats.astype(np.float32))
+    data["speech"].date = [str(sdate) for sdate in sdates]  # store raw strings for visualization
+
+    # ==========================================================
+    # 4. TOPIC NODES
+    # ==========================================================
+    topic_names = sorted({t for sid in local_speech_ids for t in topic_scores[sid]})
+    topic_name2i = {t: i for i, t in enumerate(topic_names)}
+
+    # precomputed once per model (embedding_utils.encode_static_features), never encoded here
+    if topic_table is None:
+        topic_table = embedding_utils.load_static_features()
+    data["topic"].x = torch.tensor(topic_table.get(topic_names), dtype=torch.float32)
+
+    # ==========================================================
+    # 5. DAY NODE
+    # ==========================================================
+    today_idx = date2idx[d]
+    data["day"].x = torch.tensor([[today_idx]], dtype=torch.float32)
+
+    # ==========================================================
+    # 6. AUTHOR → SPEECH edges
+    # ==========================================================
+    author_src = np.array([author_name2i[name] for name in speech_authors], dtype=np.int64)
+    data["author", "gives", "speech"].edge_index = _edge_tensor(author_src, speech_idx)
+
+    # ==========================================================
+    # 7. SPEECH → TOPIC edges (per speech, in score file order)
+    # ==========================================================
+    num_mentions = np.array([len(topic_scores[sid]) for sid in local_speech_ids], dtype=np.int64)
+    st_src = np.repeat(speech_idx, num_mentions)
+    st_dst = np.array([topic_name2i[t] for sid in local_speech_ids for t in topic_scores[sid]], dtype=np.int64)
+    st_attr = np.array([float(s) for sid in local_speech_ids for s in topic_scores[sid].values()])
+
+    data["speech", "mentions", "topic"].edge_index = _edge_tensor(st_src, st_dst)
+    data["speech", "mentions", "topic"].edge_attr = _attr_tensor(st_attr)
+
+    # ==========================================================
+    # 8. DAY → SPEECH recency edges
+    # ==========================================================
+    day_src = np.zeros(num_speeches, dtype=np.int64)
+    data["day", "references", "speech"].edge_index = _edge_tensor(day_src, speech_idx)
+    data["day", "references", "speech"].edge_attr = _attr_tensor((day - speech_days).astype(np.int64))
+
+    # ==========================================================
+    # 9. SPEECH → SPEECH temporal edges ("follows"): current speech -> past speech, attr = lag
+    # ==========================================================
+    max_lag = lookback_days if follow_max_lag is None else follow_max_lag
+    follow_src, follow_dst, follow_lag = follow_edges(speech_days, max_lag, follow_top_k)
+
+    data["speech", "follows", "speech"].edge_index = _edge_tensor(follow_src, follow_dst)
+    data["speech", "follows", "speech"].edge_attr = _attr_tensor(follow_lag)
+    data["speech", "rev_follows", "speech"].edge_index = _edge_tensor(follow_dst, follow_src)
+
+    # ==========================================================
+    # 10. REVERSE edges for other types
+    # ==========================================================
+    data["speech", "rev_gives", "author"].edge_index = _edge_tensor(speech_idx, author_src)
+    data["topic", "rev_mentions", "speech"].edge_index = _edge_tensor(st_dst, st_src)
+    data["speech", "rev_references", "day"].edge_index = _edge_tensor(speech_idx, day_src)
+
+    # ==========================================================
+    # 11. TARGET LABEL
+    # ==========================================================
+    y = float(rates_df.loc[d, target_column])
+    data.y = torch.tensor([y], dtype=torch.float32)
+    data.date = torch.tensor([today_idx], dtype=torch.long)
+
+    if profiling.enabled():
+        profiling.count(items=1)
+        profiling.add(**{f"{ntype}_nodes": data[ntype].num_nodes for ntype in data.node_types},
+                      **{f"{et[1]}_edges": data[et].num_edges for et in data.edge_types})
+    return data
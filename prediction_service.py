@@ -0,0 +1,289 @@
+"""
+Long-running prediction service: keeps the model, the embedding store and the current window
+snapshots in memory and predicts the forward Rate_Change as soon as a speech arrives.
+
+    python prediction_service.py --model fed_speech_model.pt --port 8765
+
+    POST /speech     {"id", "author", "date", "scores": {topic: score}, "text" or "embedding"}
+    POST /speeches   {"speeches": [...]}  replays a day: one prediction after each speech
+    GET  /predict?date=YYYY-MM-DD        (default: the date of the last speech added)
+    GET  /health
+
+The model is written by gnn_utils.save_model after train_model, with the global_idx
+analysis_utils.build_global_indices gives for the same speeches, topic scores and rates.
+"""
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import torch
+
+import analysis_utils
+import embedding_utils
+import gnn_utils
+import graph_utils
+from data_processing import profiling
+
+MODEL_FILE = "fed_speech_model.pt"
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+# prepared snapshots kept warm; a new speech only invalidates the dates whose window holds it
+MAX_CACHED_GRAPHS = 64
+
+
+class _LiveEmbeddings:
+    """The embedding store plus the speeches embedded since it was written (same get() interface)."""
+
+    def __init__(self, store):
+        self.store = store
+        self.extra = {}
+
+    def __contains__(self, sid):
+        return sid in self.extra or sid in self.store
+
+    def add(self, sid, vector):
+        self.extra[sid] = np.asarray(vector, dtype=np.float32).reshape(-1)
+
+    def get(self, sids, dtype=np.float32):
+        out = np.empty((len(sids), self.store.dim), dtype=dtype)
+        stored = [i for i, sid in enumerate(sids) if sid not in self.extra]
+        if stored:
+            out[stored] = self.store.get([sids[i] for i in stored], dtype)
+        for i, sid in enumerate(sids):
+            if sid in self.extra:
+                out[i] = self.extra[sid]
+        return out
+
+
+class PredictionService:
+    """
+    Warm state for online prediction. Speeches added through add_speech join the speech index,
+    the embeddings and the topic scores in place; only the snapshots whose window holds the new
+    speech are rebuilt, on the next predict.
+
+    A date the model was not trained on (today, typically) gets the day embedding of the spare
+    slot FedSpeechModel reserves after the training dates, and the Rate and Rate_Change of the
+    tenor's last quote on or before it (rates_df must be load_rates(tenor, forward_days=forward_days)).
+    """
+
+    def __init__(self, model, global_idx, speeches, embedding_store, topic_scores, rates_df,
+                 lookback_days=graph_utils.LOOKBACK_DAYS, target_column=graph_utils.TARGET_COLUMN,
+                 topic_table=None, sentence_model=None, tenor=analysis_utils.RATES_TENOR,
+                 forward_days=analysis_utils.FORWARD_DAYS):
+        self.model = model.eval()
+        self.device = next(model.parameters()).device
+        # copies: the loaders' cached dicts are never mutated
+        self.speeches = dict(speeches)
+        self.topic_scores = dict(topic_scores)
+        self.embeddings = _LiveEmbeddings(embedding_store)
+        self.rates_df = rates_df
+        self.tenor = tenor
+        self.forward_days = forward_days
+        self.global_idx ={**global_idx, "date2idx": dict(global_idx["date2idx"])}
+        self.spare_day = len(global_idx["date2idx"])
+        self.speech_index = analysis_utils.build_speech_time_index(self.speeches)
+        self.lookback_days = lookback_days
+        self.target_column = target_column
+        if topic_table is None:
+            topic_table = embedding_utils.load_static_features()
+        self.topic_table = topic_table
+        self.sentence_model = sentence_model
+        self.last_date = pd.Timestamp(self.speech_index.dates[-1]) if len(self.speech_index) else None
+
+        self._graphs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _rates_on(self, d):
+        """Rate and Rate_Change on d from the rate panel: the last quote on or before d, like load_rates."""
+        panel = analysis_utils.load_rate_panel([self.tenor])
+        quoted = panel.index[panel[self.tenor].notna() & (panel.index <= d)]
+        if quoted.empty:
+            raise KeyError(f"no {self.tenor} quote on or before {d.date()}")
+        changes = analysis_utils.rate_changes(panel, self.forward_days)
+        return [panel.at[quoted[-1], self.tenor], changes.at[quoted[-1], self.tenor]]
+
+    def _ensure_date(self, d):
+        """Add d to the rates and to date2idx."""
+        if d in self.rates_df.index:
+            return
+        row = pd.DataFrame([self._rates_on(d)], columns=["Rate", "Rate_Change"], index=pd.DatetimeIndex([d]))
+        self.rates_df = pd.concat([self.rates_df, row[self.rates_df.columns]]).sort_index()
+        self.global_idx["date2idx"].setdefault(d, self.spare_day)
+        # rows are only ever inserted: the snapshots that can change are those whose window holds d
+        self._invalidate(d)
+
+    def _embed(self, text):
+        with self._lock:
+            if self.sentence_model is None:
+                self.sentence_model = embedding_utils._load_sentence_model(embedding_utils.SENTENCE_MODEL)
+        return embedding_utils.embed_text(text, self.sentence_model)
+
+    def add_speech(self, sid, author, date, scores, text=None, embedding=None):
+        """Add (or replace) one speech and return the prediction for its date."""
+        d = pd.Timestamp(date).normalize()
+        if embedding is None:
+            embedding = self._embed(text)  # outside the lock, the slow part
+
+        with self._lock:
+            self._ensure_date(d)
+            previous = self.speeches.get(sid)
+            self.speeches[sid] = {"author": author, "text": text or "", "date": d.to_pydatetime()}
+            self.topic_scores[sid] = dict(scores)
+            self.embeddings.add(sid, embedding)
+            if previous is None:
+                self.speech_index.insert(sid, d)
+            elif pd.Timestamp(previous["date"]) != d:
+                self.speech_index = analysis_utils.build_speech_time_index(self.speeches)
+                self._invalidate(pd.Timestamp(previous["date"]))
+            self._invalidate(d)
+            self.last_date = d if self.last_date is None else max(self.last_date, d)
+            return self._predict(d)
+
+    def add_speeches(self, speeches):
+        """Replay speeches (dicts with add_speech's arguments) in date order, one prediction after each."""
+        ordered = sorted(speeches, key=lambda s: pd.Timestamp(s["date"]))
+        results = []
+        for s in ordered:
+            result = self.add_speech(s["id"], s["author"], s["date"], s["scores"],
+                                     text=s.get("text"), embedding=s.get("embedding"))
+            results.append({"id": s["id"], **result})
+        return results
+
+    def predict(self, date=None):
+        d = self.last_date if date is None else pd.Timestamp(date).normalize()
+        with self._lock:
+            self._ensure_date(d)
+            return self._predict(d)
+
+    def _invalidate(self, d):
+        # the speech is in the window of every date in [d, d + lookback_days)
+        end = d + pd.Timedelta(days=self.lookback_days)
+        for cached in [c for c in self._graphs if d <= c < end]:
+            del self._graphs[cached]
+
+    def _snapshot(self, d):
+        g = self._graphs.get(d)
+        if g is not None:
+            self._graphs.move_to_end(d)
+            return g
+        g = graph_utils.build_graph_for_date(
+            d, self.speeches, self.embeddings, self.topic_scores, self.rates_df, self.speech_index,
+            self.global_idx, lookback_days=self.lookback_days, target_column=self.target_column,
+            topic_table=self.topic_table,
+        )
+        g = gnn_utils.prepare_graph(g).to(self.device)
+        self._graphs[d] = g
+        if len(self._graphs) > MAX_CACHED_GRAPHS:
+            self._graphs.popitem(last=False)
+        return g
+
+    def _predict(self, d):
+        start = time.perf_counter()
+        with profiling.stage("predict", date=str(d.date())):
+            g = self._snapshot(d)
+            num_speeches = g["speech"].num_nodes
+            prediction = None
+            if num_speeches > 0:
+                with torch.inference_mode():
+                    prediction = float(self.model(g)[0])
+        return {
+            "date": str(d.date()),
+            "prediction": prediction,
+            "num_speeches": num_speeches,
+            "latency_ms": (time.perf_counter() - start) * 1000,
+        }
+
+
+def build_service(model_file=MODEL_FILE, lookback_days=graph_utils.LOOKBACK_DAYS, device="cpu"):
+    """Load the data and the model once and warm up on the last speech date."""
+    speeches = analysis_utils.load_speeches()
+    topic_scores = analysis_utils.load_topic_scores_by_sid()
+    rates_df = analysis_utils.load_rates()
+    global_idx = analysis_utils.build_global_indices(speeches, topic_scores, rates_df)
+
+    model = gnn_utils.load_model(model_file, global_idx, device)
+    service = PredictionService(model, global_idx, speeches, embedding_utils.load_embedding_store(),
+                                topic_scores, rates_df, lookback_days=lookback_days)
+    print("Warm-up:", service.predict())
+    return service
+
+
+def _make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _handle(self, fn):
+            try:
+                self._reply(200, fn())
+            except (KeyError, ValueError, TypeError) as e:
+                self._reply(400, {"error": f"{type(e).__name__}: {e}"})
+            except Exception as e:
+                self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/health":
+                self._reply(200, {"status": "ok", "speeches": len(service.speeches),
+                                  "last_date": None if service.last_date is None else str(service.last_date.date())})
+            elif url.path == "/predict":
+                date = parse_qs(url.query).get("date", [None])[0]
+                self._handle(lambda: service.predict(date))
+            else:
+                self._reply(404, {"error": f"unknown path {url.path}"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get("Content-Length", 0))
+
+            def body():
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            if url.path == "/speech":
+                def add():
+                    s = body()
+                    return {"id": s["id"], **service.add_speech(s["id"], s["author"], s["date"], s["scores"],
+                                                                text=s.get("text"), embedding=s.get("embedding"))}
+                self._handle(add)
+            elif url.path == "/speeches":
+                self._handle(lambda: {"predictions": service.add_speeches(body()["speeches"])})
+            else:
+                self._reply(404, {"error": f"unknown path {url.path}"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(service, host=SERVICE_HOST, port=SERVICE_PORT):
+    server = ThreadingHTTPServer((host, port), _make_handler(service))
+    print(f"Serving predictions on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=MODEL_FILE, help="gnn_utils.save_model checkpoint")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--lookback-days", type=int, default=graph_utils.LOOKBACK_DAYS)
+    args = parser.parse_args()
+
+    serve(build_service(args.model, args.lookback_days), args.host, args.port)
@@ -0,0 +1,134 @@
+"""
+Lookback / seed sweeps of FedSpeechModel on one packed snapshot build.
+
+    python sweep.py --pack graphs_lookback90.pack --lookbacks 7 14 30 60 90 --seeds 0 1 2 --workers 4
+
+The pack is built once, at the largest lookback of the sweep (graph_utils.build_all_graphs with
+lookback_days=90, then graph_dataset.pack_graph_dir); every smaller lookback is a
+graph_dataset.LookbackView of it, so nothing is rebuilt. Workers memory-map the same file, so the
+snapshots are in the page cache once whatever the number of runs.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+import analysis_utils
+import gnn_utils
+import graph_dataset
+
+SWEEP_RESULTS_FILE = "sweep_results.csv"
+
+_WORKER_STATE = {}
+
+
+def _init_worker(state, num_threads):
+    torch.set_num_threads(num_threads)
+    _WORKER_STATE.update(state)
+    _WORKER_STATE["graphs"] = graph_dataset.PackedGraphDataset(state["pack_path"])
+
+
+def _train_one(job):
+    lookback_days, seed = job
+    state = _WORKER_STATE
+    graphs = state["graphs"]
+    if lookback_days < state["pack_lookback"]:
+        graphs = graph_dataset.LookbackView(graphs, lookback_days)
+
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    start = time.perf_counter()
+    _, train_loss, val_loss = gnn_utils.train_model(graphs, state["global_idx"], hidden_dim=state["hidden_dim"],
+                                                    epochs=state["epochs"], batch_size=state["batch_size"])
+    best_epoch = min(val_loss, key=val_loss.get)
+    return {
+        "lookback_days": lookback_days,
+        "seed": seed,
+        "best_epoch": best_epoch,
+        "best_val_mse": val_loss[best_epoch],
+        "train_mse": train_loss[best_epoch],
+        "epochs": len(val_loss),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def _pack_lookback(graphs):
+    """Largest day -> speech lag in the pack, plus one: a lower bound of the lookback it was built with."""
+    lags = np.asarray(graphs.arrays["day__references__speech.attr"])
+    return int(lags.max()) + 1 if lags.size else 0
+
+
+def run_sweep(pack_path, lookbacks, seeds=(0,), global_idx=None, hidden_dim=16, epochs=100, batch_size=1,
+              num_workers=1, pack_lookback=None):
+    """
+    Train one FedSpeechModel per (lookback, seed) on LookbackViews of the packed snapshots at
+    pack_path, num_workers runs at a time. pack_lookback is the lookback the pack was built with
+    (default: inferred from its largest lag); longer lookbacks cannot be derived and are refused.
+    """
+    graphs = graph_dataset.PackedGraphDataset(pack_path)
+    if pack_lookback is None:
+        pack_lookback = _pack_lookback(graphs)
+    too_long = [L for L in lookbacks if L > pack_lookback]
+    if too_long:
+        raise ValueError(f"{pack_path} was built with a {pack_lookback}-day lookback, cannot derive {too_long}")
+
+    if global_idx is None:
+        speeches = analysis_utils.load_speeches()
+        topic_scores = analysis_utils.load_topic_scores_by_sid()
+        global_idx = analysis_utils.build_global_indices(speeches, topic_scores, analysis_utils.load_rates())
+
+    state = {
+        "pack_path": str(pack_path),
+        "pack_lookback": pack_lookback,
+        "global_idx": global_idx,
+        "hidden_dim": hidden_dim,
+        "epochs": epochs,
+        "batch_size": batch_size,
+    }
+    jobs = [(L, seed) for L in lookbacks for seed in seeds]
+
+    if num_workers <= 1 or len(jobs) <= 1:
+        _WORKER_STATE.update(state)
+        _WORKER_STATE["graphs"] = graphs
+        try:
+            results = [_train_one(job) for job in jobs]
+        finally:
+            _WORKER_STATE.clear()
+    else:
+        # torch thread pools don't survive fork, start clean interpreters
+        start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+        with mp.get_context(start_method).Pool(num_workers, initializer=_init_worker,
+                                               initargs=(state, num_threads)) as pool:
+            results = pool.map(_train_one, jobs, chunksize=1)
+
+    return pd.DataFrame(results).sort_values(["lookback_days", "seed"], ignore_index=True)
+
+
+def summarize_sweep(results):
+    """Mean and spread of the best validation MSE over seeds, per lookback."""
+    return results.groupby("lookback_days")["best_val_mse"].agg(["mean", "std", "min", "count"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pack", required=True, help="packed snapshots built at the largest lookback")
+    parser.add_argument("--lookbacks", nargs="+", type=int, required=True)
+    parser.add_argument("--pack-lookback", type=int, help="lookback the pack was built with (default: inferred)")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0])
+    parser.add_argument("--hidden-dim", type=int, default=16)
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--results", default=SWEEP_RESULTS_FILE)
+    args = parser.parse_args()
+
+    results = run_sweep(args.pack, args.lookbacks, args.seeds, hidden_dim=args.hidden_dim, epochs=args.epochs,
+                        batch_size=args.batch_size, num_workers=args.workers, pack_lookback=args.pack_lookback)
+    results.to_csv(args.results, index=False)
+    print(results.to_string(index=False))
+    print(summarize_sweep(results))
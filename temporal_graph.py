@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+import torch
+from torch_geometric.data import Dataset, HeteroData
+
+import analysis_utils
+import embedding_utils
+from graph_utils import FORWARD_DAYS, LOOKBACK_DAYS, TARGET_COLUMN, follow_edges
+
+
+# One global graph instead of one snapshot per date: every speech, author, topic and day is stored
+# once, with its timestamp, and the subgraph for a target day is cut out of it when it is needed.
+# Memory is the global arrays (a few numbers per speech and per topic mention; embeddings stay in the
+# memory-mapped store) plus one sampled window, whatever the lookback or the number of dates.
+
+class TemporalSpeechGraph:
+    """
+    Global author / speech / topic / day graph. Speeches are kept in date order (the
+    analysis_utils.SpeechTimeIndex order), so a time window is a contiguous range of rows:
+      author          global author index of each speech (authors gives speeches)
+      emb_row         row of each speech in the embedding store matrix
+      sdate_idx       global date index of the speech day (-1 when not a rates date)
+      rate_change     post-speech rate change, visible from rate_known_from on
+      mention_ptr     CSR offsets into mention_topic / mention_score (speech mentions topics)
+    """
+
+    def __init__(self, speeches, embedding_store, topic_scores, rates_df,
+                 target_column=TARGET_COLUMN, topic_table=None):
+        self.index = analysis_utils.build_speech_time_index(speeches)
+        sids = self.index.sids.tolist()
+        self.days = self.index.dates
+        self.date_str = np.array([str(speeches[sid]["date"]) for sid in sids], dtype=object)
+
+        rank = {sid: i for i, sid in enumerate(sorted(speeches))}
+        self.sid_rank = np.array([rank[sid] for sid in sids], dtype=np.int64)
+
+        self.author_names = sorted({info["author"] for info in speeches.values()})
+        author2idx = {name: i for i, name in enumerate(self.author_names)}
+        self.author = np.array([author2idx[speeches[sid]["author"]] for sid in sids], dtype=np.int64)
+
+        self.emb_matrix = embedding_store.matrix
+        self.emb_row = embedding_store.rows(sids)
+
+        # days are indexed by their position among the rates dates, like global_idx["date2idx"]
+        self.rate_dates = pd.DatetimeIndex(sorted(set(rates_df.index)))
+        speech_dates = pd.DatetimeIndex([speeches[sid]["date"] for sid in sids])
+        self.sdate_idx = self.rate_dates.get_indexer(speech_dates).astype(np.float32)
+
+        # the rate change after a speech is only known FORWARD_DAYS later, and never for the last rates date
+        loc = rates_df.index.get_indexer(speech_dates)
+        if (loc < 0).any():
+            raise KeyError(f"{speech_dates[loc < 0][0]} is not a rates date")
+        self.rate_change = rates_df[TARGET_COLUMN].to_numpy()[loc]
+        known_from = self.days + np.timedelta64(FORWARD_DAYS, "D")
+        self.rate_known_from = np.where(loc + 1 < len(rates_df.index), known_from, np.datetime64("NaT", "D"))
+        self.target = rates_df[target_column]
+
+        self.topic_names = sorted({t for scores in topic_scores.values() for t in scores})
+        topic2idx = {name: i for i, name in enumerate(self.topic_names)}
+        counts = [len(topic_scores[sid]) for sid in sids]
+        self.mention_ptr = np.zeros(len(sids) + 1, dtype=np.int64)
+        self.mention_ptr[1:] = np.cumsum(counts)
+        # per speech in the score file's topic order, which is the order build_graph_for_date uses
+        self.mention_topic = np.array([topic2idx[t] for sid in sids for t in topic_scores[sid]], dtype=np.int64)
+        self.mention_score = np.array([float(s) for sid in sids for s in topic_scores[sid].values()],
+                                      dtype=np.float64)
+
+        # precomputed once per model (embedding_utils.encode_static_features), never encoded here
+        if topic_table is None:
+            topic_table = embedding_utils.load_static_features()
+        self.topic_x = np.asarray(topic_table.get(self.topic_names), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.days)
+
+    def window_rows(self, d, lookback_days=LOOKBACK_DAYS, max_speeches=None):
+        """
+        Rows of the speeches dated in [d - lookback_days + 1, d], in speech id order. Nothing after d
+        is ever returned; max_speeches keeps only the most recent ones, capping the subgraph size.
+        """
+        start, end = self.index.bounds(np.datetime64(pd.Timestamp(d), "D"), lookback_days)
+        start, end = int(start), int(end)
+        if max_speeches is not None:
+            start = max(start, end - max_speeches)
+        rows = np.arange(start, end)
+        return rows[np.argsort(self.sid_rank[rows], kind="stable")]
+
+    def num_speeches(self, dates, lookback_days=LOOKBACK_DAYS, max_speeches=None):
+        """Subgraph sizes for many target dates at once, without sampling them."""
+        starts, ends = self.index.bounds(np.asarray(pd.DatetimeIndex(dates), dtype="datetime64[D]"), lookback_days)
+        counts = ends - starts
+        return np.minimum(counts, max_speeches) if max_speeches is not None else counts
+
+    def sample(self, d, lookback_days=LOOKBACK_DAYS, max_speeches=None, follow_top_k=None, follow_max_lag=None,
+               speech_features=True):
+        """
+        The HeteroData subgraph for target day d: the speeches in the causal window, their authors
+        and topics, and one day node. Same nodes, features, edges and order as
+        graph_utils.build_graph_for_date(d, ...) with the same follows caps when max_speeches is None.
+        With speech_features=False, speech.x only holds the column that depends on d (the rate change
+        if known) and speech.row the global row, for inputs projected once per speech
+        (gnn_utils.score_dates).
+        """
+        d = pd.Timestamp(d)
+        day = np.datetime64(d, "D")
+        rows = self.window_rows(d, lookback_days, max_speeches)
+        n = len(rows)
+        days = self.days[rows]
+
+        data = HeteroData()
+
+        # authors, sorted by name: global indices are name-sorted, so np.unique gives the local order
+        author_ids, author_src = np.unique(self.author[rows], return_inverse=True)
+        data["author"].x = torch.eye(len(author_ids), dtype=torch.float32)
+
+        # speeches: [embedding, speech date index, rate change if already known on d]
+        known = self.rate_known_from[rows] <= day
+        rate_change = np.where(known, self.rate_change[rows], 0.0)[:, None].astype(np.float32)
+        if speech_features:
+            emb = np.asarray(self.emb_matrix[self.emb_row[rows]], dtype=np.float32).reshape(n, -1)
+            data["speech"].x = torch.from_numpy(np.concatenate([emb, self.sdate_idx[rows, None], rate_change], axis=1))
+        else:
+            data["speech"].x = torch.from_numpy(rate_change)
+            data["speech"].row = torch.from_numpy(rows.astype(np.int64))
+        data["speech"].date = self.date_str[rows].tolist()  # raw strings for visualization
+
+        # topics mentioned in the window, sorted by name
+        m0, m1 = self.mention_ptr[rows], self.mention_ptr[rows + 1]
+        counts = m1 - m0
+        mentions = np.repeat(m0 - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        topic_ids, st_dst = np.unique(self.mention_topic[mentions], return_inverse=True)
+        st_src = np.repeat(np.arange(n), counts)
+        data["topic"].x = torch.from_numpy(self.topic_x[topic_ids])
+
+        data["day"].x = torch.tensor([[self.rate_dates.get_loc(d)]], dtype=torch.float32)
+
+        speech_idx = np.arange(n)
+        data["author", "gives", "speech"].edge_index = _edge_index(author_src, speech_idx)
+
+        data["speech", "mentions", "topic"].edge_index = _edge_index(st_src, st_dst)
+        data["speech", "mentions", "topic"].edge_attr = _edge_attr(self.mention_score[mentions])
+
+        lag = (day - days).astype(np.int64)
+        day_src = np.zeros(n, dtype=np.int64)
+        data["day", "references", "speech"].edge_index = _edge_index(day_src, speech_idx)
+        data["day", "references", "speech"].edge_attr = _edge_attr(lag)
+
+        max_lag = lookback_days if follow_max_lag is None else follow_max_lag
+        follow_src, follow_dst, follow_lag = follow_edges(days, max_lag, follow_top_k)
+        data["speech", "follows", "speech"].edge_index = _edge_index(follow_src, follow_dst)
+        data["speech", "follows", "speech"].edge_attr = _edge_attr(follow_lag)
+        data["speech", "rev_follows", "speech"].edge_index = _edge_index(follow_dst, follow_src)
+
+        data["speech", "rev_gives", "author"].edge_index = _edge_index(speech_idx, author_src)
+        data["topic", "rev_mentions", "speech"].edge_index = _edge_index(st_dst, st_src)
+        data["speech", "rev_references", "day"].edge_index = _edge_index(speech_idx, day_src)
+
+        data.y = torch.tensor([float(self.target.loc[d])], dtype=torch.float32)
+        data.date = torch.tensor([self.rate_dates.get_loc(d)], dtype=torch.long)
+        return data
+
+
+def _edge_index(src, dst):
+    return torch.from_numpy(np.stack([src, dst]).astype(np.int64).reshape(2, -1))
+
+
+def _edge_attr(values):
+    return torch.from_numpy(np.asarray(values, dtype=np.float32).reshape(-1, 1))
+
+
+def build_temporal_graph(speeches, embedding_store, topic_scores, rates_df,
+                         target_column=TARGET_COLUMN, topic_table=None):
+    return TemporalSpeechGraph(speeches, embedding_store, topic_scores, rates_df, target_column, topic_table)
+
+
+class TemporalGraphDataset(Dataset):
+    """
+    PyG dataset over a TemporalSpeechGraph: get(i) samples the subgraph of dates[i] (default: every
+    rates date, the dates graph_utils.build_all_graphs writes snapshots for) on the fly.
+    """
+
+    def __init__(self, graph, dates=None, lookback_days=LOOKBACK_DAYS, max_speeches=None,
+                 follow_top_k=None, follow_max_lag=None, transform=None):
+        self.graph = graph
+        self.dates = list(graph.rate_dates if dates is None else pd.DatetimeIndex(dates))
+        self.lookback_days = lookback_days
+        self.max_speeches = max_speeches
+        self.follow_top_k = follow_top_k
+        self.follow_max_lag = follow_max_lag
+        super().__init__(None, transform)
+
+    def len(self):
+        return len(self.dates)
+
+    def nonempty_indices(self):
+        """Dates with at least one speech in their window (train_model drops the others)."""
+        counts = self.graph.num_speeches(self.dates, self.lookback_days, self.max_speeches)
+        return np.flatnonzero(counts > 0).tolist()
+
+    def get(self, idx):
+        return self.graph.sample(self.dates[idx], self.lookback_days, self.max_speeches,
+                                 self.follow_top_k, self.follow_max_lag)
@@ -0,0 +1,32 @@
+"""
+The speech loaders follow the source files within one process.
+
+    python -m pytest tests
+"""
+import json
+
+import analysis_utils
+
+
+def _write_speeches(folder, speeches):
+    with open(folder / "smith.json", "w", encoding="utf-8") as f:
+        json.dump([{"id": sid, "date": "2024-03-04", "text": text} for sid, text in speeches.items()], f)
+
+
+def test_load_speeches_sees_changed_sources(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(analysis_utils, "_CORPUS_CACHE", {})
+    monkeypatch.setattr(analysis_utils, "_SPEECHES_CACHE", {})
+    folder = analysis_utils.SPEECH_FOLDER
+    folder.mkdir(parents=True)
+
+    _write_speeches(folder, {"s1": "First speech."})
+    first = analysis_utils.load_speeches()
+    assert analysis_utils.load_speeches() is first
+    assert sorted(first) == ["s1"]
+
+    _write_speeches(folder, {"s1": "First speech, revised.", "s2": "Second speech."})
+    speeches = analysis_utils.load_speeches()
+    assert sorted(speeches) == ["s1", "s2"]
+    assert speeches["s1"]["text"] == "First speech, revised."
+    assert speeches["s1"]["author"] == "smith"
@@ -0,0 +1,184 @@
+"""
+fedinprint_sync against a local mock of the fedinprint API and of a regional bank's speech pages.
+
+    python -m pytest tests
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from data_processing import data_processing_utils, fedinprint_sync, fetch_utils
+from data_processing.speech_store import read_entries
+
+AUTHOR = "s:smith-jane"
+
+
+class MockFedInPrint:
+    """
+    /api/author/<author>/items?limit=&offset=  records newest first, like the real API
+    /www.stlouisfed.org/<id>                   a speech page the stlouisfed extractor parses
+    """
+
+    def __init__(self):
+        self.records = {AUTHOR: []}
+        self.missing_pages = set()
+        self.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def publish(self, *ids):
+        """Add records on top of the listing, the last id being the newest."""
+        for rid in ids:
+            url = f"{self.url}/www.stlouisfed.org/{rid}"
+            self.records[AUTHOR].insert(0, {"id": rid, "file": [{"fileurl": url, "filefunction": "Full text"}]})
+
+    def api_offsets(self):
+        return [int(q["offset"][0]) for path, q in self.requests if path.startswith("/api/")]
+
+    def page_ids(self):
+        return [path.rsplit("/", 1)[-1] for path, _ in self.requests if path.startswith("/www.")]
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                mock.requests.append((url.path, query))
+
+                if url.path.startswith("/api/author/"):
+                    author = url.path.split("/")[3]
+                    limit, offset = int(query["limit"][0]), int(query["offset"][0])
+                    body = json.dumps({"records": mock.records.get(author, [])[offset:offset + limit]})
+                    self._send(200, body, "application/json")
+                    return
+
+                rid = url.path.rsplit("/", 1)[-1]
+                if rid in mock.missing_pages:
+                    self._send(404, "not found", "text/plain")
+                    return
+                self._send(200, f"""
+                    <div class="component content"><p>March 4, 2024</p></div>
+                    <div class="field-content"><div class="wrapper"><p>Speech {rid}.</p></div></div>
+                """, "text/html")
+
+            def _send(self, status, body, content_type):
+                payload = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def mock_api(tmp_path, monkeypatch):
+    mock = MockFedInPrint()
+    thread = threading.Thread(target=mock.server.serve_forever, daemon=True)
+    thread.start()
+
+    # the sync runs from the scraping directory: text_data/ and the state file are relative to it
+    monkeypatch.chdir(tmp_path)
+    with open(tmp_path / "author_maps.json", "w", encoding="utf-8") as f:
+        json.dump([{"author_key": AUTHOR}], f)
+    monkeypatch.setattr(data_processing_utils, "FED_PRINTS_API", f"{mock.url}/api")
+
+    previous = fetch_utils.get_fetcher()
+    fetcher = fetch_utils.Fetcher(requests_per_second=0, max_retries=0)
+    fetch_utils.set_fetcher(fetcher)
+    try:
+        yield mock
+    finally:
+        fetch_utils.set_fetcher(previous)
+        fetcher.close()
+        mock.server.shutdown()
+        mock.server.server_close()
+
+
+def _sync(page_size=10, full=False):
+    return fedinprint_sync.sync_all_authors("author_maps.json", "fedinprint_sync.json", page_size=page_size, full=full)
+
+
+def _stored_ids():
+    return [entry["id"] for entry in read_entries("text_data/smith.json")]
+
+
+def test_first_sync_pages_through_every_record(mock_api):
+    mock_api.publish(*[f"fedlsp:{i}" for i in range(25)])
+
+    state = _sync()
+
+    assert mock_api.api_offsets() == [0, 10, 20]
+    assert sorted(_stored_ids()) == sorted(f"fedlsp:{i}" for i in range(25))
+    assert len(state[AUTHOR]["seen"]) == 25
+    assert state[AUTHOR]["pending"] == []
+
+
+def test_refresh_resumes_from_the_state_file(mock_api):
+    mock_api.publish(*[f"fedlsp:{i}" for i in range(25)])
+    _sync()
+
+    mock_api.publish("fedlsp:25", "fedlsp:26")
+    mock_api.requests.clear()
+    state = _sync()
+
+    # only the first page is listed, only the two new speeches are scraped
+    assert mock_api.api_offsets() == [0]
+    assert sorted(mock_api.page_ids()) == ["fedlsp:25", "fedlsp:26"]
+    assert len(_stored_ids()) == 27
+    with open("fedinprint_sync.json", "r", encoding="utf-8") as f:
+        assert json.load(f) == state
+    assert len(state[AUTHOR]["seen"]) == 27
+
+
+def test_nothing_new_transfers_nothing(mock_api):
+    mock_api.publish(*[f"fedlsp:{i}" for i in range(25)])
+    _sync()
+
+    mock_api.requests.clear()
+    _sync()
+
+    assert mock_api.api_offsets() == [0]
+    assert mock_api.page_ids() == []
+    assert len(_stored_ids()) == 25
+
+
+def test_records_repeated_across_pages_are_listed_once(mock_api):
+    mock_api.publish(*[f"fedlsp:{i}" for i in range(15)])
+    # a record published between two page requests shifts the listing: page 2 repeats page 1's last record
+    records = mock_api.records[AUTHOR]
+    mock_api.records[AUTHOR] = records[:10] + records[9:]
+
+    assert len(fedinprint_sync.fetch_new_records(AUTHOR, {}, page_size=10)) == 15
+    state = _sync(full=True)
+
+    stored = _stored_ids()
+    assert len(stored) == len(set(stored)) == 15
+    assert len(state[AUTHOR]["seen"]) == 15
+
+
+def test_failed_downloads_are_retried_without_duplicates(mock_api):
+    mock_api.publish(*[f"fedlsp:{i}" for i in range(5)])
+    mock_api.missing_pages = {"fedlsp:3"}
+    state = _sync()
+
+    assert [r["id"] for r in state[AUTHOR]["pending"]] == ["fedlsp:3"]
+    assert "fedlsp:3" not in _stored_ids()
+
+    mock_api.missing_pages = set()
+    mock_api.requests.clear()
+    state = _sync()
+
+    assert mock_api.page_ids() == ["fedlsp:3"]
+    assert state[AUTHOR]["pending"] == []
+    stored = _stored_ids()
+    assert len(stored) == len(set(stored)) == 5
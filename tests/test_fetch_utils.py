@@ -0,0 +1,54 @@
+"""
+Fetcher.map concurrency is bounded per fetcher, whatever the number of callers.
+
+    python -m pytest tests
+"""
+import threading
+import time
+
+from data_processing.fetch_utils import Fetcher
+
+
+def test_concurrent_maps_share_max_workers():
+    fetcher = Fetcher(max_workers=3, requests_per_second=0)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def work(value):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return value * 2
+
+    results = {}
+
+    def consume(name):
+        results[name] = sorted(result for _, result, _ in fetcher.map(work, ((i, i) for i in range(10))))
+
+    callers = [threading.Thread(target=consume, args=(name,)) for name in range(4)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    fetcher.close()
+
+    assert peak[0] <= 3
+    assert all(results[name] == [2 * i for i in range(10)] for name in range(4))
+
+
+def test_errors_are_yielded_not_raised():
+    fetcher = Fetcher(max_workers=2, requests_per_second=0)
+
+    def work(value):
+        if value == 1:
+            raise ValueError("bad page")
+        return value
+
+    outcomes = {key: (result, error) for key, result, error in fetcher.map(work, [("a", 0), ("b", 1)])}
+    fetcher.close()
+
+    assert outcomes["a"] == (0, None)
+    assert isinstance(outcomes["b"][1], ValueError)
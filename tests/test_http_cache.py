@@ -0,0 +1,56 @@
+"""
+HttpCache blob bookkeeping: every blob on disk belongs to at least one cached URL.
+
+    python -m pytest tests
+"""
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from data_processing.http_cache import HttpCache
+
+
+def _response(body, etag=None):
+    resp = requests.Response()
+    resp.status_code = 200
+    resp._content = body
+    resp.encoding = "utf-8"
+    resp.headers = CaseInsensitiveDict({"Content-Type": "text/html", **({"ETag": etag} if etag else {})})
+    return resp
+
+
+def _blobs(cache):
+    return sorted(p.name for p in cache.blob_dir.glob("*/*") if p.is_file())
+
+
+def test_changed_body_replaces_the_old_blob(tmp_path):
+    cache = HttpCache(tmp_path / "http_cache")
+    cache.store("https://example.org/a", _response(b"first version", etag='"1"'))
+    cache.store("https://example.org/a", _response(b"second version!", etag='"2"'))
+
+    entry = cache.lookup("https://example.org/a")
+    assert _blobs(cache) == [entry["sha256"]]
+    assert cache.total_bytes() == len(b"second version!")
+    assert cache.response(entry).content == b"second version!"
+    cache.close()
+
+
+def test_blob_still_served_by_another_url_is_kept(tmp_path):
+    cache = HttpCache(tmp_path / "http_cache")
+    cache.store("https://example.org/a", _response(b"shared body"))
+    cache.store("https://example.org/b", _response(b"shared body"))
+    cache.store("https://example.org/a", _response(b"new body"))
+
+    assert len(_blobs(cache)) == 2
+    assert cache.response(cache.lookup("https://example.org/b")).content == b"shared body"
+    assert cache.response(cache.lookup("https://example.org/a")).content == b"new body"
+    cache.close()
+
+
+def test_revisions_stay_under_the_size_cap(tmp_path):
+    cache = HttpCache(tmp_path / "http_cache", max_bytes=250)
+    for revision in range(5):
+        cache.store("https://example.org/listing", _response(bytes([65 + revision]) * 100))
+
+    assert len(_blobs(cache)) == 1
+    assert cache.total_bytes() == 100
+    cache.close()
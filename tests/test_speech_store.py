@@ -0,0 +1,88 @@
+"""
+speech_store compaction, including runs interrupted between its steps.
+
+    python -m pytest tests
+"""
+import json
+import os
+
+import pytest
+
+from data_processing import speech_store
+from data_processing.speech_store import SpeechStore, compact, read_entries
+
+
+def _entries(*ids):
+    return [{"id": i, "text": f"Speech {i}."} for i in ids]
+
+
+def _ids(output_json):
+    return [entry["id"] for entry in read_entries(output_json)]
+
+
+@pytest.fixture
+def store_file(tmp_path):
+    output_json = tmp_path / "smith.json"
+    with SpeechStore(output_json) as store:
+        for entry in _entries("a", "b"):
+            store.append(entry)
+    compact(output_json)
+    with SpeechStore(output_json) as store:
+        for entry in _entries("c", "d"):
+            store.append(entry)
+    return output_json
+
+
+def test_compact_folds_the_log_into_the_base(store_file):
+    assert compact(store_file) == 2
+
+    with open(store_file, "r", encoding="utf-8") as f:
+        assert [entry["id"] for entry in json.load(f)] == ["a", "b", "c", "d"]
+    assert not store_file.with_suffix(".jsonl").exists()
+    assert compact(store_file) == 0
+
+
+def test_crash_after_the_log_was_renamed(store_file):
+    # compact() stopped before writing the base: the entries are only in the compacting file
+    os.replace(store_file.with_suffix(".jsonl"), store_file.with_suffix(".jsonl.compacting"))
+    with SpeechStore(store_file) as store:
+        assert "c" in store
+        store.append(_entries("e")[0])
+    assert _ids(store_file) == ["a", "b", "c", "d", "e"]
+
+    assert compact(store_file) == 3
+    assert _ids(store_file) == ["a", "b", "c", "d", "e"]
+    assert not store_file.with_suffix(".jsonl.compacting").exists()
+
+
+def test_crash_after_the_base_was_replaced(store_file, monkeypatch):
+    # compact() stopped before removing the compacting file: it must not be applied a second time
+    monkeypatch.setattr(speech_store.Path, "unlink", lambda self, missing_ok=False: None)
+    compact(store_file)
+    monkeypatch.undo()
+    assert store_file.with_suffix(".jsonl.compacting").exists()
+
+    assert _ids(store_file) == ["a", "b", "c", "d"]
+    assert compact(store_file) == 0
+    assert _ids(store_file) == ["a", "b", "c", "d"]
+    assert not store_file.with_suffix(".jsonl.compacting").exists()
+
+
+def test_damaged_base_raises(store_file):
+    with open(store_file, "w", encoding="utf-8") as f:
+        f.write('[{"id": "a"')
+
+    with pytest.raises(ValueError):
+        read_entries(store_file)
+    with pytest.raises(ValueError):
+        compact(store_file)
+
+
+def test_compact_folder_finishes_an_interrupted_compaction(store_file):
+    os.replace(store_file.with_suffix(".jsonl"), store_file.with_suffix(".jsonl.compacting"))
+
+    speech_store.compact_folder(store_file.parent)
+
+    with open(store_file, "r", encoding="utf-8") as f:
+        assert [entry["id"] for entry in json.load(f)] == ["a", "b", "c", "d"]
+    assert not store_file.with_suffix(".jsonl.compacting").exists()
@@ -0,0 +1,126 @@
+"""
+tone_utils.score_speeches against a local stand-in for the OpenAI chat completions endpoint.
+
+    python -m pytest tests
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("openai")
+
+import analysis_utils
+import tone_utils
+
+TOPICS = ["Fed Funds Rate", "Labor Market", "Inflation", "Real Activity", "Financial Stability", "Balance Sheet"]
+
+
+class MockChatCompletions:
+    """POST /v1/chat/completions: answers every prompt with the same six scores and records the speech."""
+
+    def __init__(self):
+        self.speeches = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                prompt = request["messages"][0]["content"]
+                mock.speeches.append(prompt.split("--- Speech ---")[1].strip())
+
+                body = json.dumps({
+                    "id": "chatcmpl-test",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request["model"],
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": json.dumps({t: 0.5 for t in TOPICS})},
+                        "finish_reason": "stop",
+                    }],
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _write_speeches(speeches):
+    folder = analysis_utils.SPEECH_FOLDER
+    folder.mkdir(parents=True, exist_ok=True)
+    with open(folder / "smith.json", "w", encoding="utf-8") as f:
+        json.dump([{"id": sid, "date": "2024-03-04", "text": text} for sid, text in speeches.items()], f)
+
+
+@pytest.fixture
+def mock_api(tmp_path, monkeypatch):
+    mock = MockChatCompletions()
+    thread = threading.Thread(target=mock.server.serve_forever, daemon=True)
+    thread.start()
+
+    # data/ paths are relative; the corpus cache must not serve another test's speeches
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(analysis_utils, "_CORPUS_CACHE", {})
+    _write_speeches({"s1": "First speech.", "s2": "Second speech.", "s3": "Third speech."})
+    try:
+        yield mock
+    finally:
+        mock.server.shutdown()
+        mock.server.server_close()
+
+
+def _score(mock, prompt_version=tone_utils.PROMPT_VERSION):
+    scorer = tone_utils.make_openai_scorer(base_url=mock.url, api_key="test", max_retries=0)
+    return tone_utils.score_speeches(scorer, prompt_version=prompt_version, max_concurrency=2)
+
+
+def _scored_ids():
+    with open(analysis_utils.TOPIC_SCORE_FOLDER / "score_smith.json", "r", encoding="utf-8") as f:
+        rows = json.load(f)
+    assert all(row[tone_utils.TONE_MODEL] == {t: 0.5 for t in TOPICS} for row in rows)
+    return sorted(row["id"] for row in rows)
+
+
+def test_second_run_sends_nothing(mock_api):
+    assert _score(mock_api) == 0
+    assert sorted(mock_api.speeches) == ["First speech.", "Second speech.", "Third speech."]
+    assert _scored_ids() == ["s1", "s2", "s3"]
+
+    mock_api.speeches.clear()
+    assert _score(mock_api) == 0
+    assert mock_api.speeches == []
+    assert _scored_ids() == ["s1", "s2", "s3"]
+
+
+def test_only_changed_texts_are_sent_again(mock_api):
+    _score(mock_api)
+
+    _write_speeches({"s1": "First speech.", "s2": "Second speech, revised.", "s3": "Third speech.",
+                     "s4": "Fourth speech."})
+    mock_api.speeches.clear()
+    _score(mock_api)
+
+    assert sorted(mock_api.speeches) == ["Fourth speech.", "Second speech, revised."]
+    assert _scored_ids() == ["s1", "s2", "s3", "s4"]
+
+
+def test_new_prompt_version_rescores_everything(mock_api):
+    _score(mock_api)
+
+    mock_api.speeches.clear()
+    _score(mock_api, prompt_version="tone-test")
+
+    assert sorted(mock_api.speeches) == ["First speech.", "Second speech.", "Third speech."]
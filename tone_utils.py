@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+import analysis_utils
+from data_processing import profiling, speech_store
+
+TONE_MODEL = "gpt-5"
+# Bump PROMPT_VERSION whenever PROMPT_TEMPLATE changes: cached scores are keyed by it, so only
+# the speeches scored under an older prompt (or whose text changed) are sent again.
+PROMPT_VERSION = "tone-v1"
+TONE_START_DATE = datetime(2018, 1, 1)
+
+# Append-only store of every score ever returned, keyed by prompt version, model and text hash.
+# It lives next to the score files (the loaders only glob topic_scores/*.json, not subfolders).
+# It is generated, not versioned: on a fresh checkout seed_tone_cache() rebuilds it from the
+# score_*.json files, so scoring does not resend speeches that already have a score.
+TONE_CACHE_FILE = analysis_utils.TOPIC_SCORE_FOLDER / "cache" / "tone_cache.json"
+
+PROMPT_TEMPLATE = """
+    You are a financial policy analyst. Given the Federal Reserve speech below,
+    rate the speaker’s tone toward each of the following topics on a continuous scale
+    from -1 (dovish) to +1 (hawkish). Return only six numbers in JSON format
+    with keys exactly as shown below.
+
+    Topics and scoring guide:
+    - Fed Funds Rate: hawkish = likely rate hike; dovish = likely rate cut
+    - Labor Market: hawkish = strong labor market; dovish = weak labor market
+    - Inflation: hawkish = high or concerning inflation; dovish = low or less concerning inflation
+    - Real Activity: hawkish = strong real activity; dovish = weak real activity
+    - Financial Stability: hawkish = stable system; dovish = less stable system
+    - Balance Sheet: hawkish = in or start of QT or balance sheet reduction, end of QE; dovish = start or in QE or expansion, end of QT
+
+    Respond ONLY with JSON like this:
+    {{
+      "Fed Funds Rate": 0.4,
+      "Labor Market": -0.2,
+      "Inflation": 0.6,
+      "Real Activity": 0.1,
+      "Financial Stability": 0.3,
+      "Balance Sheet": -0.5
+    }}
+
+    --- Speech ---
+    {speech_text}
+    """
+
+
+def build_prompt(speech_text):
+    return PROMPT_TEMPLATE.format(speech_text=speech_text)
+
+
+def tone_cache_key(speech_text, model=TONE_MODEL, prompt_version=PROMPT_VERSION):
+    text_hash = hashlib.sha256(speech_text.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{prompt_version}\0{model}\0{text_hash}".encode("utf-8")).hexdigest()
+
+
+def make_openai_scorer(model=TONE_MODEL, base_url=None, api_key=None, max_retries=3):
+    """
+    speech_text -> {topic: score} through the chat completions API. base_url points it at any
+    OpenAI-compatible endpoint, e.g. a local fake server when testing the pipeline.
+    """
+    from dotenv import load_dotenv
+    from openai import OpenAI
+
+    load_dotenv()
+    client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"), base_url=base_url, max_retries=max_retries)
+
+    def score_tone(speech_text):
+        response = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": build_prompt(speech_text)}],
+        )
+        return json.loads(response.choices[0].message.content)
+
+    return score_tone
+
+
+def load_tone_cache(cache_file=TONE_CACHE_FILE):
+    return {entry["id"]: entry["scores"] for entry in speech_store.read_entries(cache_file)}
+
+
+def _speech_rows(authors=None, start_date=TONE_START_DATE):
+    """Corpus rows to score, grouped by author in file order (the order of the score files)."""
+    corpus = analysis_utils.load_corpus()
+    keep = corpus["date"] > np.datetime64(start_date, "D")
+    if authors is not None:
+        keep &= np.isin(corpus["author"], list(authors))
+
+    rows_by_author = defaultdict(list)
+    for i in np.flatnonzero(keep):
+        rows_by_author[str(corpus["author"][i])].append(int(i))
+    return corpus, dict(rows_by_author)
+
+
+def _write_scores(path, rows):
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def seed_tone_cache(score_folder=analysis_utils.TOPIC_SCORE_FOLDER, cache_file=TONE_CACHE_FILE,
+                    model=TONE_MODEL, prompt_version=PROMPT_VERSION):
+    """Import existing score_*.json files as scores of the current text under prompt_version."""
+    corpus = analysis_utils.load_corpus()
+    row_of = {sid: i for i, sid in enumerate(corpus["id"].tolist())}
+
+    with speech_store.SpeechStore(cache_file, flush_every=1000) as cache:
+        for score_file in sorted(Path(score_folder).glob("score_*.json")):
+            with open(score_file, "r", encoding="utf-8") as f:
+                for row in json.load(f):
+                    if row["id"] not in row_of or model not in row:
+                        continue
+                    speech_text = analysis_utils.corpus_text(corpus, row_of[row["id"]])
+                    cache.append({"id": tone_cache_key(speech_text, model, prompt_version), "scores": row[model]})
+    print(f"Tone cache holds {len(cache)} scores")
+
+
+@profiling.profiled("score_speeches")
+def score_speeches(score_tone, authors=None, model=TONE_MODEL, prompt_version=PROMPT_VERSION,
+                   max_concurrency=8, out_dir=analysis_utils.TOPIC_SCORE_FOLDER, cache_file=TONE_CACHE_FILE,
+                   start_date=TONE_START_DATE):
+    """
+    Score every speech after start_date and write out_dir/score_<author>.json.
+
+    Texts whose (prompt_version, model, text hash) is already cached are not sent again; the rest go
+    to score_tone with at most max_concurrency requests in flight. Each score is appended to the
+    cache as it arrives, so a failed or interrupted run resumes where it stopped, and an author's
+    file is rewritten as soon as all of that author's speeches are scored.
+    """
+    corpus, rows_by_author = _speech_rows(authors, start_date)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    texts = {}
+    keys_by_author = {}
+    for author, rows in rows_by_author.items():
+        keys_by_author[author] = []
+        for i in rows:
+            speech_text = analysis_utils.corpus_text(corpus, i)
+            key = tone_cache_key(speech_text, model, prompt_version)
+            texts[key] = speech_text
+            keys_by_author[author].append(key)
+
+    scores = load_tone_cache(cache_file)
+    todo = [key for key in texts if key not in scores]
+    print(f"{len(texts)} speeches, {len(texts) - len(todo)} cached, {len(todo)} to score")
+    profiling.count(hits=len(texts) - len(todo), misses=len(todo))
+
+    # authors with speeches left to score; their file is rewritten once the last one arrives
+    waiting = {author: {key for key in keys if key not in scores} for author, keys in keys_by_author.items()}
+    waiting = {author: keys for author, keys in waiting.items() if keys}
+
+    def write_author(author):
+        ids = corpus["id"][rows_by_author[author]].tolist()
+        new_rows = {sid: {"id": sid, model: scores[key]}
+                    for sid, key in zip(ids, keys_by_author[author]) if key in scores}
+        # existing rows are updated in place; rows this run has no score for (speeches before
+        # start_date, failed requests) are kept until a later run replaces them
+        path = out_dir / f"score_{author}.json"
+        rows = []
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                rows = [new_rows.pop(row["id"], row) for row in json.load(f)]
+        _write_scores(path, rows + list(new_rows.values()))
+
+    num_failed = 0
+    with speech_store.SpeechStore(cache_file) as cache, ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        futures = {pool.submit(score_tone, texts[key]): key for key in todo}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                scores[key] = future.result()
+            except Exception as e:
+                num_failed += 1
+                print(f"[ERROR] Scoring failed: {e}")
+                continue
+            cache.append({"id": key, "scores": scores[key]})
+
+            for author in [author for author, keys in waiting.items() if key in keys]:
+                waiting[author].discard(key)
+                if not waiting[author]:
+                    del waiting[author]
+                    write_author(author)
+
+    # authors with failed requests get what was scored, authors without a file get one
+    for author in rows_by_author:
+        if author in waiting or not (out_dir / f"score_{author}.json").exists():
+            write_author(author)
+    profiling.count(items=len(todo) - num_failed)
+    profiling.add(failed=num_failed)
+    if num_failed:
+        print(f"{num_failed} speeches failed; run again to retry them")
+    return num_failed